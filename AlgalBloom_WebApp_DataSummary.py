@@ -31,13 +31,16 @@
 #########################
 # pd.set_option('display.max_columns', None)
 
-import geopandas as gpd
 import pandas as pd
 import statistics
 
-from datetime import datetime
 from datetime import date
 
+from metadata_io import as_datetime
+from mission_schema import mission_schemas, project_mission, read_options
+from size_budget import write_within_budget
+from summary_io import read_missions, print_start_times
+
 
 ###
 ### USER INPUT ###
@@ -57,72 +60,56 @@ infile_data_radarsat_cm = 'radarsat_cm/data/RADARSAT-cm_20220101_20221107_greatl
 
 outfile = root + 'data_summary/data_algalbloom_summary_2021-May-Nov_' + str(date.today()) + '.shp'
 
+# date columns (shapefile names); parsed into timestamps when read if they're stored as strings
+#   inputs can be shapefiles, GeoPackages or GeoParquet files; columns are renamed to their shapefile names
+datetime_columns = ['beginposit', 'ingestiond', 'starttime']
 
+# bloom season: only records that start in it are read from the mission files (date_start < start time < date_end)
+date_start = '2021-04-30'
+date_end = '2021-12-01'
 
-###
-### SCRIPT START ###
-###
-
-# import data
-data_s1_sar = gpd.read_file(root + infile_data_s1_sar)
-data_s2_msi = gpd.read_file(root + infile_data_s2_msi)
-data_s3_olci = gpd.read_file(root + infile_data_s3_olci)
-data_landsat_oli = gpd.read_file(root + infile_data_landsat_oli)
-data_radarsat_1 = gpd.read_file(root + infile_data_radarsat_1)
-data_radarsat_2 = gpd.read_file(root + infile_data_radarsat_2)
-data_radarsat_cm = gpd.read_file(root + infile_data_radarsat_cm)
-
-
-# add/replace information to each sensor as necessary
-data_radarsat_2['datatype'] = 'Raw'
-data_landsat_oli['mission'] = 'LANDSAT'
-
-data_s1_sar = data_s1_sar.replace({'platformid': {'2014-016A':'Sentinel-1A', '2016-025A':'Sentinel-1B'}})
-data_s3_olci = data_s3_olci.replace({'platformid': {'2016-011A':'Sentinel-3A', '0000-000A':'Sentinel-3B', '2018-039A':'Sentinel-3B'}})
-data_s3_olci = data_s3_olci.replace({'productlev': {'L1':'Level 1', 'L2':'Level 2'}})
-data_landsat_oli = data_landsat_oli.replace({'Satellite': {8:'LANDSAT-8', 9:'LANDSAT-9'}})
-data_radarsat_1 = data_radarsat_1.replace({'processing': {'l1':'Level 1'}})
-data_radarsat_1 = data_radarsat_1.replace({'collection': {'Radarsat1':'RADARSAT-1'}})
-data_radarsat_2 = data_radarsat_2.replace({'collection': {'Radarsat2RawProducts':'RADARSAT-2'}})
-data_radarsat_cm = data_radarsat_cm.replace({'collection': {'RCMImageProducts':'RADARSAT-CM'}})
-data_radarsat_cm = data_radarsat_cm.replace({'processing': {'l1':'Level 1', 'l3':'Level 3'}})
-data_radarsat_cm = data_radarsat_cm.replace({'satelliteI': {'RCM-1':'RADARSAT-CM 1', 'RCM-2':'RADARSAT-CM 2', 'RCM-3':'RADARSAT-CM 3'}})
+# bounding box of the region of interest (minx, miny, maxx, maxy; lat/lon); only footprints that intersect it are read
+#   None for everywhere
+bbox = None
 
+# file size budget (MB) for the ArcGIS Online outputs; footprints are simplified (per mission) as needed to fit
+budget_mb = 10
 
-# strip down the data to (a bit more than...) the necessary basics...
-parameter_pass_s1_sar = ['link', 'beginposit', 'ingestiond', 'slicenumbe', 'orbitnumbe', 'relativeor', 'sensoroper', 'orbitdirec', 'producttyp', 'platformna', 'platformid', 'filename', 'polarisati', 'uuid', 'geometry']
-parameter_pass_s2_msi = ['link', 'beginposit', 'ingestiond', 'orbitnumbe', 'relativeor', 'cloudcover', 'tileid', 'platformna', 'filename', 'orbitdirec', 'platformse', 'processi_1', 'uuid', 'geometry']
-parameter_pass_s3_olci = ['link', 'beginposit', 'ingestiond', 'orbitnumbe', 'relativeor', 'productlev', 'platformna', 'platformid', 'filename', 'producttyp', 'timeliness', 'orbitdirec', 'relpassnum', 'passnumber', 'uuid', 'cloudcover', 'geometry']
-parameter_pass_landsat_oli = ['Landsat Pr', 'Landsat Sc', 'Collection', 'WRS Path', 'WRS Row', 'Scene Clou', 'Start Time', 'Day/Night', 'Sun Elevat', 'Sun Azimut', 'Data Type', 'Sensor Ide', 'UTM Zone', 'Ellipsoid', 'mission', 'geometry', 'Satellite']
-parameter_pass_radarsat_1 = ['recordId', 'collection', 'processing', 'incidenceA', 'polarizati', 'orbitDirec', 'absoluteOr', 'spatialRes', 'beam', 'sensorMode', 'lookOrient', 'lutApplied', 'title', 'featureId', 'downloadLi', 'thisRecord', 'starttime', 'geometry', 'productTyp']
-parameter_pass_radarsat_2 = ['recordId', 'collection', 'incidenceA', 'beam', 'segmentQua', 'orbitDirec', 'absoluteOr', 'polarizati', 'transmitPo', 'spatialRes', 'sensorMode', 'featureId', 'lookOrient', 'title', 'starttime', 'geometry', 'datatype']
-parameter_pass_radarsat_cm = ['recordId', 'collection', 'processing', 'incidenceA', 'numberOfAz', 'productTyp', 'polarizati', 'beamModeTy', 'orbitDirec', 'numberOfRa', 'spatialRes', 'polariza_1', 'sampledPix', 'lookOrient', 'satelliteI', 'productApp', 'lutApplied', 'relativeOr', 'beamModeDe', 'absoluteOr', 'title', 'featureId', 'thisRecord', 'starttime', 'geometry']
 
 
-data_s1_sar = data_s1_sar[parameter_pass_s1_sar]
-data_s2_msi = data_s2_msi[parameter_pass_s2_msi]
-data_s3_olci = data_s3_olci[parameter_pass_s3_olci]
-data_landsat_oli = data_landsat_oli[parameter_pass_landsat_oli]
-data_radarsat_1 = data_radarsat_1[parameter_pass_radarsat_1]
-data_radarsat_2 = data_radarsat_2[parameter_pass_radarsat_2]
-data_radarsat_cm = data_radarsat_cm[parameter_pass_radarsat_cm]
-
-
-
-# rename information as necessary
-data_s1_sar.rename(columns={'beginposit':'starttime', 'ingestiond':'ingestion', 'slicenumbe':'slice', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'sensoroper':'sensormode', 'orbitdirec':'orbit_dir', 'platformna': 'mission', 'platformid':'platform', 'producttyp':'datatype'}, inplace=True)
-
-data_s2_msi.rename(columns={'beginposit':'starttime', 'ingestiond':'ingestion', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'platformna':'mission', 'orbitdirec':'orbit_dir', 'platformse':'platform', 'processi_1':'proc_level', 'producttyp':'datatype'}, inplace=True)
+###
+### SCRIPT START ###
+###
 
-data_s3_olci.rename(columns={'beginposit':'starttime', 'ingestiond':'ingestion', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'productlev':'proc_level', 'platformna':'mission', 'platformid':'platform', 'orbitdirec': 'orbit_dir', 'relpassnum':'passnumRel', 'passnumber':'passnumAbs', 'producttyp':'datatype'}, inplace=True)
+# import data; all files are read at the same time (see summary_io.py)
+#   only the columns needed for the summary fields & the records in the bloom season/region of interest are read
+infiles = {'Sentinel-1': root + infile_data_s1_sar, 'Sentinel-2': root + infile_data_s2_msi, 'Sentinel-3': root + infile_data_s3_olci,
+           'LANDSAT': root + infile_data_landsat_oli, 'RADARSAT-1': root + infile_data_radarsat_1,
+           'RADARSAT-2': root + infile_data_radarsat_2, 'RADARSAT-CM': root + infile_data_radarsat_cm}
+data = read_missions(infiles, datetime_columns=datetime_columns,
+                     read_options={mission: read_options(mission, mission_schemas[mission]['fields'], date_start, date_end, bbox) for mission in infiles})
 
-data_landsat_oli.rename(columns={'Landsat Pr':'filename', 'Landsat Sc':'sceneid', 'Scene Clou':'cloudcover', 'Start Time':'starttime', 'Sun Elevat':'sun_elev', 'Sun Azimut':'sun_azim', 'Data Type':'datatype', 'Sensor Ide':'sensorid', 'productid1':'filename', 'Satellite':'platform'}, inplace=True)
+# web app fields of each mission (field names & values declared in mission_schema.py), stripped down to (a bit more
+# than...) the necessary basics
+data = {mission: project_mission(data[mission], mission, fields=mission_schemas[mission]['fields']) for mission in data}
 
-data_radarsat_1.rename(columns={'collection':'mission', 'processing':'proc_level', 'incidenceA':'angle_inc', 'orbitDirec':'orbit_dir', 'absoluteOr':'orbit_abs', 'sensorMode':'sensormode', 'downloadLi':'link', 'polarizati':'polarisati', 'productTyp':'datatype', 'title':'filename'}, inplace=True)
+### need to convert the date fields in all data to be consistent and in the format: 
+# print out sample dates from each data set to see what their format is... so that I know how to change it
+#   missions without records in the bloom season (only those are read) come back empty; they're reported instead
+print_start_times(data)
 
-data_radarsat_2.rename(columns={'collection':'mission', 'incidenceA':'angle_inc', 'segmentQua':'quality', 'absoluteOr':'orbit_abs', 'polarizati':'polarisati', 'transmitPo':'polTransmt', 'sensorMode':'sensormode', 'title':'filename', 'orbitDirec':'orbit_dir'}, inplace=True)
+# Sentinel series dates are alright...
+# RADARSAT series dates are alright... 
+# ...LANDSAT-8 datetimes (day of year) are converted to timestamps with the other fields (see mission_schema.py)
 
-data_radarsat_cm.rename(columns={'collection': 'mission', 'processing':'proc_level', 'incidenceA':'angle_inc', 'numberOfAz':'AzLookNum', 'polarizati':'polarisati', 'beamModeTy':'beammode', 'orbitDirec':'orbit_dir', 'numberOfRa':'RngLookNum', 'polariza_1':'PolIn_Prod', 'sampledPix':'pxlSpacing', 'satelliteI':'platform', 'productApp':'applicatin', 'relativeOr':'orbit_rel', 'beamModeDe':'beam_mode', 'absoluteOr':'orbit_abs', 'productTyp':'datatype', 'title':'filename'}, inplace=True)
+data_s1_sar = data['Sentinel-1']
+data_s2_msi = data['Sentinel-2']
+data_s3_olci = data['Sentinel-3']
+data_landsat_oli = data['LANDSAT']
+data_radarsat_1 = data['RADARSAT-1']
+data_radarsat_2 = data['RADARSAT-2']
+data_radarsat_cm = data['RADARSAT-CM']
+del data
 
 
 # check number of characters in each of the columns (shapefiles can have max 10 characters/column)
@@ -135,40 +122,14 @@ for i in range(len(sensors)):
 
 
 
-### need to convert the date fields in all data to be consistent and in the format: 
-# print out sample dates from each data set to see what their format is... so that I know how to change it
-print('Sentinel-1 SAR datetime format: ', data_s1_sar['starttime'][0], '\n')
-print('Sentinel-2 MSI datetime format: ', data_s2_msi['starttime'][0], '\n')
-print('Sentinel-3 OLCI datetime format: ', data_s3_olci['starttime'][0], '\n')
-print('LANDSAT-8 OLI datetime format: ', data_landsat_oli['starttime'][0], '\n')
-print('RADARSAT-1 SAR datetime format: ', data_radarsat_1['starttime'][0], '\n')
-print('RADARSAT-2 SAR datetime format: ', data_radarsat_2['starttime'][0], '\n')
-print('RADARSAT-CM SAR datetime format: ', data_radarsat_cm['starttime'][0], '\n')
-
-# Sentinel series dates are alright...
-# RADARSAT series dates are alright... 
-# ...convert LANDSAT-8 datetime to the same format
-landsat_datetime_fmt = '%Y:%j:%H:%M:%S.%f'
-
-data_landsat_oli['starttime_tmp'] = ""   # need to create the field... 
-data_landsat_oli['starttime_tmp'] = data_landsat_oli.apply(lambda x: x['starttime'][:-1], axis = 1)   # need to strip the last digit for .strptime to recognize it as a date
-for i in range(len(data_landsat_oli)):
-    data_landsat_oli['starttime_tmp'][i] = datetime.strptime(data_landsat_oli['starttime_tmp'][i], landsat_datetime_fmt)
-    data_landsat_oli['starttime'][i] = data_landsat_oli['starttime_tmp'][i].strftime('%Y-%m-%d %H:%M:%S.%f')
-
-
-# delete unnecessary columns
-data_landsat_oli = data_landsat_oli.drop('starttime_tmp', axis=1)
-
-
 # combine the data
 data_sum = pd.concat([data_s1_sar, data_s2_msi, data_s3_olci, data_landsat_oli, data_radarsat_1, data_radarsat_2, data_radarsat_cm], ignore_index=True)
 
 
 ### CLIP DATA to relevant timeline
-data_sum['starttime_tmp'] = pd.to_datetime(data_sum['starttime'], format='%Y-%m-%d %H:%M:%S.%f')
-data_sum = data_sum[(data_sum['starttime_tmp'] > '2021-04-30') & (data_sum['starttime_tmp'] < '2021-12-01')]
-data_sum = data_sum.drop('starttime_tmp', axis=1)
+#   start times are timestamps, so this is a plain comparison (they're only formatted as strings when written to a shapefile)
+data_sum['starttime'] = as_datetime(data_sum['starttime'])
+data_sum = data_sum[(data_sum['starttime'] > date_start) & (data_sum['starttime'] < date_end)]
 
 
 ### DROP OTHER COLUMNS TO REDUCE FILESIZE
@@ -189,7 +150,8 @@ data_sum['cloudcover'] = data_sum['cloudcover'].fillna(-1)
 
 
 # ouput as shapefile
-data_sum.to_file(outfile)
+#   footprints are simplified if needed to fit the file size budget; each mission gets its own tolerance
+write_within_budget(data_sum, outfile, budget_mb=budget_mb, group_column='mission')
 
 
 
@@ -230,6 +192,6 @@ plt.show()
 
 
 outfile_cloud = root + 'data_summary/data_algalbloom_summary_2019-May-Nov_' + str(date.today()) + '_cloud.shp'
-data_sum_cloud.to_file(outfile_cloud)
+write_within_budget(data_sum_cloud, outfile_cloud, budget_mb=budget_mb, group_column='mission')
 
 
@@ -29,7 +29,6 @@
 
 #########################
 
-import geopandas as gpd
 import pandas as pd
 import statistics
 import numpy as np
@@ -37,6 +36,11 @@ import numpy as np
 from datetime import datetime
 from datetime import date
 
+from metadata_io import as_datetime
+from mission_schema import mission_schemas, project_mission, read_options
+from size_budget import write_within_budget
+from summary_io import read_missions, write_missions
+
 # pd.set_option('display.max_columns', None)
 
 
@@ -53,6 +57,13 @@ output_folder = 'ArcGIS_online/'
 
 outfile_datasum = root + output_folder + 'data_algalbloom_summary_2022-May-Nov07_' + str(date.today()) + '.shp'
 
+# file size budget (MB) for the ArcGIS Online outputs; footprints are simplified (per mission) as needed to fit
+budget_mb = 10
+
+# date columns (shapefile names); parsed into timestamps when read if they're stored as strings
+#   inputs can be shapefiles, GeoPackages or GeoParquet files; columns are renamed to their shapefile names
+datetime_columns = ['beginposit', 'ingestiond', 'starttime']
+
 missions = ['LANDSAT', 'Sentinel-1', 'Sentinel-2', 'Sentinel-3', 'RADARSAT-1', 'RADARSAT-2', 'RADARSAT-CM']
 
 data = {
@@ -80,72 +91,25 @@ data = {
 }
 
 
-# parameters to keep for the Data Summary file; using the updated field names
-data['LANDSAT']['parameter pass'] = ['filename', 'sceneid', 'Collection', 'WRS Path', 'WRS Row', 'cloudcover', 'starttime', 'Day/Night', 'sun_elev', 'sun_azim', 'datatype', 'sensorid', 'UTM Zone', 'Ellipsoid', 'mission', 'geometry', 'platform']
-data['Sentinel-1']['parameter pass'] = ['link', 'starttime', 'ingestion', 'slice', 'orbit_abs', 'orbit_rel', 'sensormode', 'orbit_dir', 'datatype', 'mission', 'platform', 'filename', 'polarisati', 'uuid', 'geometry']
-data['Sentinel-2']['parameter pass'] = ['link', 'starttime', 'ingestion', 'orbit_abs', 'orbit_rel', 'cloudcover', 'tileid', 'mission', 'filename', 'orbit_dir', 'platform', 'proc_level', 'uuid', 'geometry']
-data['Sentinel-3']['parameter pass'] = ['link', 'starttime', 'ingestion', 'orbit_abs', 'orbit_rel', 'proc_level', 'mission', 'platform', 'filename', 'datatype', 'timeliness', 'orbit_dir', 'passnumRel', 'passnumAbs', 'uuid', 'cloudcover', 'geometry']
-data['RADARSAT-1']['parameter pass'] = ['recordId', 'mission', 'proc_level', 'angle_inc', 'polarisati', 'orbit_dir', 'orbit_abs', 'spatialRes', 'beam', 'sensormode', 'lookOrient', 'lutApplied', 'filename', 'featureId', 'link', 'thisRecord', 'starttime', 'geometry', 'datatype']
-data['RADARSAT-2']['parameter pass'] = ['recordId', 'mission', 'angle_inc', 'quality', 'orbit_dir', 'orbit_abs', 'polarisati', 'polTransmt', 'spatialRes', 'sensormode', 'featureId', 'lookOrient', 'filename', 'starttime', 'geometry', 'datatype']
-data['RADARSAT-CM']['parameter pass'] = ['recordId', 'mission', 'proc_level', 'angle_inc', 'AzLookNum', 'datatype', 'polarisati', 'beammode', 'orbit_dir', 'RngLookNum', 'spatialRes', 'PolIn_Prod', 'pxlSpacing', 'lookOrient', 'platform', 'applicatin', 'lutApplied', 'orbit_rel', 'beam_mode', 'orbit_abs', 'filename', 'featureId', 'thisRecord', 'starttime', 'geometry']
-
-
-
-
 ###
 ### SCRIPT START ###
 ###
 
+# all mission files are read at the same time (see summary_io.py); dates are parsed in each mission's format
+print('Reading data... ')
+mission_data = read_missions({mission: root + data[mission]['folder'] + data[mission]['infile'] for mission in missions}, datetime_columns=datetime_columns,
+                             read_options={mission: read_options(mission) for mission in missions})
+for mission in missions:
+    data[mission]['data'] = mission_data[mission]
+del mission_data
+
+
+# add/replace/delete/rename data; field names & values of each mission are declared in mission_schema.py (same as for
+# the data summary script)
+#   LANDSAT: it's the merged file of Level 1 & level 2 data from landsat89.py, which has the web app fields already
+#   (if the data is level 2, that filename is used)
 for mission in missions:
-    print('Reading data... ', mission)
-    data[mission]['data'] = gpd.read_file(root + data[mission]['folder'] + data[mission]['infile'])
-    
-
-
-# add/replace/delete/rename data
-# LANDSAT
-#   need to also combine the file names since it's a merged file of Level 1 & level 2 data
-#   if the data is level 2, use that filename only
-data['LANDSAT']['data']['filename'] = ''
-for i in range(len(data['LANDSAT']['data'])):
-    if data['LANDSAT']['data']['Landsat _1'][i] == None:
-        data['LANDSAT']['data']['filename'][i] = data['LANDSAT']['data']['Landsat Pr'][i]
-    else:
-        data['LANDSAT']['data']['filename'][i] = data['LANDSAT']['data']['Landsat _1'][i]
-
-data['LANDSAT']['data']['mission'] = 'LANDSAT'
-data['LANDSAT']['data'] = data['LANDSAT']['data'].replace({'Satellite': {8:'LANDSAT-8', 9:'LANDSAT-9'}})
-data['LANDSAT']['data'] = data['LANDSAT']['data'].drop('Collecti_1', axis=1)
-data['LANDSAT']['data'].rename(columns={'Landsat Sc':'sceneid', 'Scene Clou':'cloudcover', 'Start Time':'starttime', 'Sun Elevat':'sun_elev', 'Sun Azimut':'sun_azim', 'Data Type':'datatype', 'Sensor Ide':'sensorid', 'Satellite':'platform', 'Landsat Pr':'filenameL1', 'Landsat _1':'filenameL2', 'Target WRS': 'WRS Path_T', 'Target W_1':'WRS Row_T'}, inplace=True)
-
-# SENTINEL-1
-data['Sentinel-1']['data'] = data['Sentinel-1']['data'].replace({'platformid': {'2014-016A':'Sentinel-1A', '2016-025A':'Sentinel-1B'}})
-data['Sentinel-1']['data'] = data['Sentinel-1']['data'].drop('swathident', axis=1)
-data['Sentinel-1']['data'].rename(columns={'beginposit':'starttime', 'ingestiond':'ingestion', 'slicenumbe':'slice', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'sensoroper':'sensormode', 'orbitdirec':'orbit_dir', 'platformna': 'mission', 'platformid':'platform', 'producttyp':'datatype'}, inplace=True)
-
-# SENTINEL-2
-data['Sentinel-2']['data'] = data['Sentinel-2']['data'].drop(['platformid', 'processing', 'producttyp'], axis=1)
-data['Sentinel-2']['data'].rename(columns={'beginposit':'starttime', 'ingestiond':'ingestion', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'platformna':'mission', 'orbitdirec':'orbit_dir', 'platformse':'platform', 'processi_1':'proc_level', 'producttyp':'datatype'}, inplace=True)
-
-# Sentinel-3
-data['Sentinel-3']['data'] = data['Sentinel-3']['data'].replace({'platformid': {'2016-011A':'Sentinel-3A', '2018-039A':'Sentinel-3B'}, 'productlev': {'L1': 'Level 1', 'L2': 'Level 2'}})
-data['Sentinel-3']['data'] = data['Sentinel-3']['data'].drop(['link_icon', 'summary', 'identifier', 'procfacili', 'procfaci_1', 'processing'], axis=1)
-data['Sentinel-3']['data'].rename(columns={'beginposit':'starttime', 'ingestiond':'ingestion', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'productlev':'proc_level', 'platformna':'mission', 'platformid':'platform', 'orbitdirec': 'orbit_dir', 'relpassnum':'passnumRel', 'passnumber':'passnumAbs', 'producttyp':'datatype'}, inplace=True)
-
-# RADARSAT-1 
-data['RADARSAT-1']['data'] = data['RADARSAT-1']['data'].replace({'processing': {'l1':'Level 1'}, 'collection': {'Radarsat1': 'RADARSAT-1'}})
-data['RADARSAT-1']['data'].rename(columns={'collection':'mission', 'processing':'proc_level', 'incidenceA':'angle_inc', 'orbitDirec':'orbit_dir', 'absoluteOr':'orbit_abs', 'sensorMode':'sensormode', 'downloadLi':'link', 'polarizati':'polarisati', 'productTyp':'datatype', 'title':'filename'}, inplace=True)
-
-# RADARSAT-2
-data['RADARSAT-2']['data']['datatype'] = 'Raw'
-data['RADARSAT-2']['data'] = data['RADARSAT-2']['data'].replace({'collection': {'Radarsat2RawProducts':'RADARSAT-2'}})
-data['RADARSAT-2']['data'] = data['RADARSAT-2']['data'].drop(['startDate', 'position', 'beam', 'wktGeometr'], axis=1)
-data['RADARSAT-2']['data'].rename(columns={'collection':'mission', 'incidenceA':'angle_inc', 'segmentQua':'quality', 'absoluteOr':'orbit_abs', 'polarizati':'polarisati', 'transmitPo':'polTransmt', 'sensorMode':'sensormode', 'title':'filename', 'orbitDirec':'orbit_dir'}, inplace=True)
-
-# RADARSAT-CM
-data['RADARSAT-CM']['data'] = data['RADARSAT-CM']['data'].replace({'collection': {'RCMImageProducts':'RADARSAT-CM'}, 'processing': {'l1':'Level 1', 'l3':'Level 3'}, 'satelliteI': {'RCM-1':'RADARSAT-CM 1', 'RCM-2':'RADARSAT-CM 2', 'RCM-3':'RADARSAT-CM 3'}})
-data['RADARSAT-CM']['data'] = data['RADARSAT-CM']['data'].drop(['acquisitio', 'beamMnemon', 'acquisit_1', 'sensorFold', 'wktGeometr'], axis=1)
-data['RADARSAT-CM']['data'].rename(columns={'collection': 'mission', 'processing':'proc_level', 'incidenceA':'angle_inc', 'numberOfAz':'AzLookNum', 'polarizati':'polarisati', 'beamModeTy':'beammode', 'orbitDirec':'orbit_dir', 'numberOfRa':'RngLookNum', 'polariza_1':'PolIn_Prod', 'sampledPix':'pxlSpacing', 'satelliteI':'platform', 'productApp':'applicatin', 'relativeOr':'orbit_rel', 'beamModeDe':'beam_mode', 'absoluteOr':'orbit_abs', 'productTyp':'datatype', 'title':'filename'}, inplace=True)
+    data[mission]['data'] = project_mission(data[mission]['data'], mission)
 
 
 
@@ -160,9 +124,10 @@ for mission in missions:
 
 
 # OUTPUT AS INDIVIDUAL SHAPEFILES
-for mission in missions: 
-    data[mission]['data'].to_file(root + output_folder + data[mission]['outfile'])
-    print('Sucessfully output to shapefile:   ', mission)
+#   footprints are simplified if needed to fit the file size budget (the geometric error introduced is printed)
+#   all mission files are written at the same time (see summary_io.py)
+write_missions({mission: (data[mission]['data'], root + output_folder + data[mission]['outfile']) for mission in missions}, budget_mb=budget_mb)
+print('Sucessfully output to shapefile:   ', missions)
 
 
 
@@ -170,10 +135,10 @@ for mission in missions:
 ### MAKING THE DATA SUMMARY FILE
 print('\n\n\nMaking the data summary file...')
 
-# clip data to only the fields needed for the summary file 
+# clip data to only the fields needed for the summary file (see mission_schema.py)
 for mission in missions:
     print('Summarizing for data summary file... ', mission)
-    data[mission]['data'] = data[mission]['data'][data[mission]['parameter pass']]
+    data[mission]['data'] = data[mission]['data'][mission_schemas[mission]['fields']]
 
 # EDIT CLOUD COVER INFORMATION... 
 ### only keep cloud cover from LANDSAT and Sentinel-2
@@ -185,9 +150,9 @@ data['Sentinel-3']['data']['cloudcover'] = np.nan
 data_sum = pd.concat([data['LANDSAT']['data'], data['Sentinel-1']['data'], data['Sentinel-2']['data'], data['Sentinel-3']['data'], data['RADARSAT-1']['data'], data['RADARSAT-2']['data'], data['RADARSAT-CM']['data']], ignore_index=True)
 
 # clip to relevant timeline
-data_sum['starttime_tmp'] = pd.to_datetime(data_sum['starttime'], format='%Y-%m-%d %H:%M:%S.%f')
-data_sum = data_sum[(data_sum['starttime_tmp'] > '2022-04-30') & (data_sum['starttime_tmp'] < '2022-11-08')]
-data_sum = data_sum.drop('starttime_tmp', axis=1)
+#   start times are timestamps, so this is a plain comparison (they're only formatted as strings when written to a shapefile)
+data_sum['starttime'] = as_datetime(data_sum['starttime'])
+data_sum = data_sum[(data_sum['starttime'] > '2022-04-30') & (data_sum['starttime'] < '2022-11-08')]
 
 ### DROP OTHER COLUMNS TO REDUCE FILESIZE
 data_sum = data_sum.drop(['applicatin', 'AzLookNum', 'RngLookNum', 'PolIn_Prod', 'beam_mode', 'pxlSpacing'], axis=1)   # only relevant to RADARSAT-CM...
@@ -205,4 +170,5 @@ data_sum['cloudcover'] = data_sum['cloudcover'].fillna(-1)
 
 
 # ouput as shapefile
-data_sum.to_file(outfile_datasum)
+#   footprints are simplified if needed to fit the file size budget; each mission gets its own tolerance
+write_within_budget(data_sum, outfile_datasum, budget_mb=budget_mb, group_column='mission')
@@ -27,38 +27,11 @@
 
 ###########################################################################################
 
-import json
-import datetime 
-import collections
-import os
-import math
-import pandas as pd
-import geopandas as gpd
-
-from timeit import default_timer as timer
-from sentinelsat import SentinelAPI, read_geojson, geojson_to_wkt
-from datetime import date
-from collections import OrderedDict
-from sys import argv
-from os.path import exists
 from timeit import default_timer as timer
-from datetime import timedelta
-from shapely import wkt
-from datetime import datetime
-from datetime import date
 
-def defaultconverter(o):
-    if isinstance(o, datetime.datetime):
-        return o.__str__()
-
-def convert_size(size_bytes):
-    if size_bytes == 0:
-        return "0B"
-    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 2)
-    return "%s %s" % (s, size_name[i])
+from sentinel_query import roi_footprint, query_sentinel, products_to_gdf, ingestion_filter, drop_unchanged, ingestion_watermark
+from incremental import read_state, write_state, read_output, upsert
+from metadata_io import write_metadata
 
 
 
@@ -90,6 +63,34 @@ parameters_pass_L2A = { 'link', 'beginposition', 'endposition', 'ingestiondate',
 # specify platform; needs to be supported by Copernicus API hub
 platformname = 'Sentinel-2'
 
+# split the time period of interest into windows of this many days, and query this many windows at the same time
+window_days = 30
+workers = 4
+
+# query backend: 'opensearch' fetches the result pages of each window in parallel (at most 'connections' requests at a
+#   time, over keep-alive connections); 'sentinelsat' fetches them one at a time
+backend = 'opensearch'
+connections = 8
+
+# folder for the cache of query responses (None to not use a cache); cached date windows aren't queried again
+#   - cache_days: cached windows older than this are queried again; cache_mb: maximum size of the cache
+#   - offline = True re-runs the script from the cache only (e.g. to change the parameters of interest), without logging in
+query_cache_dir = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/query_cache/'
+cache_days = 7
+cache_mb = 500
+offline = False
+
+# columns with datetime format (kept as timestamps; only written as strings to shapefiles, which don't support datetimes)
+datetime_columns = ['beginposition', 'endposition', 'ingestiondate']
+
+# incremental updates: only query the products ingested since the last run and add them to the existing output;
+#   set to False to query the whole time period again
+incremental = True
+
+# groups of products that have the same keys, with the parameters of interest for each group
+groups = [(lambda product: product['processinglevel'] == 'Level-1C', parameters_pass_L1C),
+          (lambda product: product['processinglevel'] == 'Level-2A', parameters_pass_L2A)]
+
 
 
 ###
@@ -98,37 +99,50 @@ platformname = 'Sentinel-2'
 
 
 ###
-### DOWNLOAD THE METADATA FROM COPERNICUS API HUB ###
+### INCREMENTAL UPDATES ###
 ###
 
-# login to Copernicus
-api = SentinelAPI(username, password, url)
-print('\nSentinel API login successful \n')
+# what was processed in the last run (uuids already in the output & latest ingestion date)
+#   only valid if the output was made with the same settings and still exists
+incremental_settings = {'start_date': start_date, 'end_date': end_date, 'roi': roi, 'platformname': platformname, 'parameters_pass_L1C': sorted(parameters_pass_L1C), 'parameters_pass_L2A': sorted(parameters_pass_L2A)}
+state = read_state(outfile, incremental_settings) if incremental else None
+
+existing = read_output(outfile, state['columns'], datetime_columns=datetime_columns) if state is not None and 'columns' in state else None
+if existing is None:
+    state = None
+else:
+    print('Incremental update; last run processed products ingested up to: ' + str(state['watermark']))
+
+
+
+###
+### DOWNLOAD THE METADATA FROM COPERNICUS API HUB ###
+###
 
 # query products; gets some metadata information for each file
-footprint = geojson_to_wkt(read_geojson(roi))
+#   the time period is split into date windows that are queried at the same time
+footprint = roi_footprint(roi)
 print('\n\nDownloading metadata for: ', platformname, ': ', start_date, '-', end_date, ' for ', roi_shortname)
 start = timer()
-products = api.query(footprint, date=(start_date, end_date), platformname=platformname)
+products = query_sentinel(username, password, url, footprint, start_date, end_date, window_days=window_days, workers=workers, backend=backend, connections=connections, cache_dir=query_cache_dir, cache_days=cache_days, cache_mb=cache_mb, offline=offline, platformname=platformname, ingestiondate=ingestion_filter(state))
+products = drop_unchanged(products, state)
 
 
 
 ###
 ### FILTER/SUBSET THE METADATA TO INFORMATION RELEVANT TO ALGAL BLOOMS TO TRIM AND SAVE SPACE ###
+### & CONVERT TO GEODATAFRAME ###
 ###
 
-# split the data into groups that have the same keys 
-products_L1 = [products[footprint] for footprint in products if products[footprint]['processinglevel'] == 'Level-1C']
-products_L2 = [products[footprint] for footprint in products if products[footprint]['processinglevel'] == 'Level-2A']
-
-# extract a subset of keys from these sub-groups 
-products_L1_subset = [{k1: v1 for k1, v1 in products_L1[j].items() if k1 in parameters_pass_L1C} for j in range(len(products_L1))]
-products_L2_subset = [{k1: v1 for k1, v1 in products_L2[j].items() if k1 in parameters_pass_L2A} for j in range(len(products_L2))]
+# split the data into groups that have the same keys, extract a subset of keys from these sub-groups & re-merge
+# dates stay timestamps until the output is written
+products_subset_gdf = products_to_gdf(products, groups)
 
-# re-merge these subgroups
-products_subset = products_L1_subset + products_L2_subset
+# incremental: upsert the new & updated products into the existing ones (unchanged products were dropped after the query)
+print(str(len(products_subset_gdf)) + ' new/updated products')
+products_subset_gdf = upsert(existing, products_subset_gdf, 'uuid')
 
-print('... subsetted products successfully ...')
+print('... conversion complete ...')
 
 
 
@@ -136,27 +150,10 @@ print('... subsetted products successfully ...')
 ### OUTPUT DATA ###
 ###
 
-# save as shapefile 
-#   converting through dict > pandas dataframe > geopandas geodataframe
-#   create a geometry column to convert to geodataframe 
-products_subset_df = pd.DataFrame(products_subset)
-products_subset_df['footprint'] = gpd.GeoSeries.from_wkt(products_subset_df['footprint'])
-products_subset_gdf = gpd.GeoDataFrame(products_subset_df, geometry=products_subset_df['footprint'], crs='EPSG:4326')
+# output data; the storage format follows the extension of outfile (.shp, .gpkg or .parquet)
+write_metadata(products_subset_gdf, outfile)
 
-# drop the temporary footprint column 
-products_subset_gdf = products_subset_gdf.drop(['footprint'], axis=1)
-
-# convert columns with datetime format (not supported in conversion to shapefile)
-datetime_format = '%Y-%m-%d %H:%M:%S.%f'
-products_subset_gdf['beginposition'] = products_subset_gdf['beginposition'].dt.strftime(datetime_format)
-products_subset_gdf['endposition'] = products_subset_gdf['endposition'].dt.strftime(datetime_format)
-products_subset_gdf['ingestiondate'] = products_subset_gdf['ingestiondate'].dt.strftime(datetime_format)
-
-print('... conversion complete ...')
-
-
-# output data
-products_subset_gdf.to_file(outfile)
+# record what has been processed, for the next incremental update
+write_state(outfile, incremental_settings, ingestion_watermark(products_subset_gdf), {'uuid': products_subset_gdf['uuid']}, columns=products_subset_gdf.columns)
 
 print('... data output!')
-
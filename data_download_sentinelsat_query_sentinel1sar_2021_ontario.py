@@ -27,25 +27,11 @@
 #########################
 
 
-import json
-import datetime 
-import collections
-import os
-import math
-import pandas as pd
-import geopandas as gpd
-
-from timeit import default_timer as timer
-from sentinelsat import SentinelAPI, read_geojson, geojson_to_wkt
-from datetime import date
-from collections import OrderedDict
-from sys import argv
-from os.path import exists
 from timeit import default_timer as timer
-from datetime import timedelta
-from shapely import wkt
-from datetime import datetime
-from datetime import date
+
+from sentinel_query import roi_footprint, query_sentinel, products_to_gdf, ingestion_filter, drop_unchanged, ingestion_watermark
+from incremental import read_state, write_state, read_output, upsert
+from metadata_io import write_metadata
 
 
 
@@ -83,74 +69,88 @@ parameters_pass_raw = { 'filename', 'link', 'link_alternative', 'beginposition',
 start_date = '20210101' # format: YYYYMMDD; 1 Jan 2021
 end_date = '20211231' # format: YYYYMMDD; 31 Dec 2021
 
-outfilename = outfilename_base + '_' + start_date + '_' + end_date + '_ontario_' + str(date.today()) + outfile_ext
+outfilename = outfilename_base + '_' + start_date + '_' + end_date + '_ontario' + outfile_ext
 outfile = outdir + outfilename
 
+# split the time period of interest into windows of this many days, and query this many windows at the same time
+window_days = 30
+workers = 4
+
+# query backend: 'opensearch' fetches the result pages of each window in parallel (at most 'connections' requests at a
+#   time, over keep-alive connections); 'sentinelsat' fetches them one at a time
+backend = 'opensearch'
+connections = 8
+
+# folder for the cache of query responses (None to not use a cache); cached date windows aren't queried again
+#   - cache_days: cached windows older than this are queried again; cache_mb: maximum size of the cache
+#   - offline = True re-runs the script from the cache only (e.g. to change the parameters of interest), without logging in
+query_cache_dir = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data_s1sar_intermediate/query_cache/'
+cache_days = 7
+cache_mb = 500
+offline = False
+
+# columns with datetime format (kept as timestamps; only written as strings to shapefiles, which don't support datetimes)
+datetime_columns = ['beginposition', 'endposition', 'ingestiondate']
+
+# incremental updates: only query the products ingested since the last run and add them to the existing output;
+#   set to False to query the whole time period again
+incremental = True
+
+# groups of products that have the same keys, with the parameters of interest for each group
+groups = [(lambda product: product['sensoroperationalmode'] != 'WV' and product['producttype'] != 'RAW', parameters_pass_L1_notWV),
+          (lambda product: product['sensoroperationalmode'] == 'WV', parameters_pass_WV),
+          (lambda product: product['producttype'] == 'RAW', parameters_pass_raw)]
+
+# unnecessary columns, dropped before saving
+drop_columns = ['gmlfootprint', 'link_alternative']
+
+
 
 ###
 ### SCRIPT START ###
 ###
 
-def defaultconverter(o):
-    if isinstance(o, datetime.datetime):
-        return o.__str__()
+###
+### INCREMENTAL UPDATES ###
+###
 
-def convert_size(size_bytes):
-    if size_bytes == 0:
-        return "0B"
-    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 2)
-    return "%s %s" % (s, size_name[i])
+# what was processed in the last run (uuids already in the output & latest ingestion date)
+#   only valid if the output was made with the same settings and still exists
+incremental_settings = {'start_date': start_date, 'end_date': end_date, 'roi': roi, 'platformname': 'Sentinel-1', 'parameters_pass_L1_notWV': sorted(parameters_pass_L1_notWV), 'parameters_pass_WV': sorted(parameters_pass_WV), 'parameters_pass_raw': sorted(parameters_pass_raw)}
+state = read_state(outfile, incremental_settings) if incremental else None
 
+existing = read_output(outfile, state['columns'], datetime_columns=datetime_columns) if state is not None and 'columns' in state else None
+if existing is None:
+    state = None
+else:
+    print('Incremental update; last run processed products ingested up to: ' + str(state['watermark']))
 
-# login to Copernicus
-api = SentinelAPI(username, password, url)
-#print('\nSentinel API login successful \n')
 
 
 # output geojson filename
 print('\n\nDownloading metadata for: Sentinel 1 SAR-C: YEAR 2021\n')
 start = timer()
-#print(datetime.datetime.now())
 
 # query products; gets some metadata information for each file
-footprint = geojson_to_wkt(read_geojson(roi))
-products = api.query(footprint, date=(start_date, end_date), platformname='Sentinel-1')
+#   the time period is split into date windows that are queried at the same time
+footprint = roi_footprint(roi)
+products = query_sentinel(username, password, url, footprint, start_date, end_date, window_days=window_days, workers=workers, backend=backend, connections=connections, cache_dir=query_cache_dir, cache_days=cache_days, cache_mb=cache_mb, offline=offline, platformname='Sentinel-1', ingestiondate=ingestion_filter(state))
+products = drop_unchanged(products, state)
 
 
 # extract subset of keys
-# split the data into group that have the same keys 
-products_L1_notWV = [products[footprint] for footprint in products if products[footprint]['sensoroperationalmode'] != 'WV' and products[footprint]['producttype'] != 'RAW']
-products_WV = [products[footprint] for footprint in products if products[footprint]['sensoroperationalmode'] == 'WV']
-products_raw = [products[footprint] for footprint in products if products[footprint]['producttype'] == 'RAW']
-
-# extract a subset of keys from these sub-groups 
-products_L1_notWV_subset = [{k1: v1 for k1, v1 in products_L1_notWV[j].items() if k1 in parameters_pass_L1_notWV} for j in range(len(products_L1_notWV))]
-products_WV_subset = [{k1: v1 for k1, v1 in products_WV[j].items() if k1 in parameters_pass_WV} for j in range(len(products_WV))]
-products_raw_subset = [{k1: v1 for k1, v1 in products_raw[j].items() if k1 in parameters_pass_raw} for j in range(len(products_raw))]
-
-# re-merge these subgroups
-products_subset = products_L1_notWV_subset + products_WV_subset + products_raw_subset
+# split the data into group that have the same keys, extract a subset of keys from these sub-groups & re-merge
+# dates stay timestamps until the output is written
+products_subset_gdf = products_to_gdf(products, groups, drop_columns=drop_columns)
 
-
-# save as shapefile directly instead of geojson
-### converting through dict > pandas dataframe > geopandas geodataframe
-### need to create a geometry column to convert to geodataframe 
-products_subset_df = pd.DataFrame(products_subset)
-products_subset_df['footprint'] = gpd.GeoSeries.from_wkt(products_subset_df['footprint'])
-products_subset_gdf = gpd.GeoDataFrame(products_subset_df, geometry=products_subset_df['footprint'], crs='EPSG:4326')
-
-# drop some unnecessary columns... 
-products_subset_gdf = products_subset_gdf.drop(['footprint', 'gmlfootprint', 'link_alternative'], axis=1)
-
-# convert columns with datetime format (not supported to conversion to shapefile)
-datetime_format = '%Y-%m-%d %H:%M:%S.%f'
-products_subset_gdf['beginposition'] = products_subset_gdf['beginposition'].dt.strftime(datetime_format)
-products_subset_gdf['endposition'] = products_subset_gdf['endposition'].dt.strftime(datetime_format)
-products_subset_gdf['ingestiondate'] = products_subset_gdf['ingestiondate'].dt.strftime(datetime_format)
+# incremental: upsert the new & updated products into the existing ones (unchanged products were dropped after the query)
+print(str(len(products_subset_gdf)) + ' new/updated products')
+products_subset_gdf = upsert(existing, products_subset_gdf, 'uuid')
 
 
 ### SAVE !!! 
-products_subset_gdf.to_file(outfile)
+# the storage format follows the extension of outfile (.shp, .gpkg or .parquet)
+write_metadata(products_subset_gdf, outfile)
+
+# record what has been processed, for the next incremental update
+write_state(outfile, incremental_settings, ingestion_watermark(products_subset_gdf), {'uuid': products_subset_gdf['uuid']}, columns=products_subset_gdf.columns)
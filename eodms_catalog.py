@@ -0,0 +1,153 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Local catalog of EODMS (RADARSAT) metadata, keyed by collection & recordId (SQLite database)
+#   - keeps the full metadata of every record fetched so far, so it's never fetched again: searches only need the
+#     recordIds (brief results, see eodms_harvest.harvest_new) & only unknown records are fetched in full
+#   - outputs are made from the catalog for any time period/region of interest without connecting to EODMS
+#       - the records are read straight into compact record columns (see record_columns.py), only keeping the fields
+#         of interest
+#       - time period: acquisition start of each record (first timestamp of the collection schema, see eodms_schema.py)
+#       - region of interest: same form as the EODMSRAPI features (operator, WKT); records are pre-selected on their
+#         bounding box in the database & the operator is applied to the footprints
+#   - re-harvesting a year becomes a top-up: the search runs again, but only new records are downloaded
+
+### CATALOG FILE ###
+# records table: collection, recordId, start (yyyy-mm-ddThh:mm:ss), bounding box of the footprint, fetch time &
+#   full metadata (JSON, as returned by rapi.get_results('full'))
+
+### LIMITATIONS ###
+# - records are kept as they were when fetched; records that change in EODMS (rare) are only updated if they're
+#   removed from the catalog first (or the catalog is deleted)
+# - regions of interest have to be given as WKT (not as files)
+
+###########################################################################
+
+import json
+import os
+import sqlite3
+
+from datetime import datetime
+
+import shapely
+
+from eodms_harvest import eodms_date_fmt, is_excluded
+from eodms_schema import eodms_schemas, eodms_datetime_fmt, eodms_datetime_suffix
+from record_columns import RecordColumns
+
+
+
+###
+### SETTINGS ###
+###
+
+# EODMS region of interest operator > shapely predicate (footprint, region of interest)
+roi_operators = {
+    'intersects': shapely.intersects,
+    'contains': shapely.contains,
+    'contained by': shapely.within,
+    'within': shapely.within,
+    'crosses': shapely.crosses,
+    'disjoint with': shapely.disjoint,
+    'overlaps': shapely.overlaps,
+    'touches': shapely.touches,
+}
+
+
+
+###
+### CATALOG FILE ###
+###
+
+# open (or create) a catalog
+def open_catalog(path):
+    folder = os.path.dirname(path)
+    if folder != '':
+        os.makedirs(folder, exist_ok=True)
+    catalog = sqlite3.connect(path)
+    catalog.execute('CREATE TABLE IF NOT EXISTS records (collection TEXT, recordId TEXT, start TEXT, '
+                    'minx REAL, miny REAL, maxx REAL, maxy REAL, fetched TEXT, metadata TEXT, PRIMARY KEY (collection, recordId))')
+    catalog.execute('CREATE INDEX IF NOT EXISTS records_start ON records (collection, start)')
+    return catalog
+
+
+# field with the acquisition start of a collection
+def start_field(collection):
+    return next(iter(eodms_schemas[collection]['timestamps']))
+
+
+
+###
+### ADDING RECORDS ###
+###
+
+# recordIds in the catalog for a collection
+def catalog_ids(catalog, collection):
+    return set(record_id for (record_id,) in catalog.execute('SELECT recordId FROM records WHERE collection = ?', (collection,)))
+
+
+# add records with their full metadata (records already in the catalog are replaced)
+def add_records(catalog, collection, records):
+    field = start_field(collection)
+    fetched = datetime.now().strftime(eodms_datetime_fmt)
+    rows = []
+    for record in records:
+        footprint = shapely.from_wkt(record['wktGeometry']) if record.get('wktGeometry') else None
+        bounds = shapely.bounds(footprint) if footprint is not None else [None] * 4
+        start = (record.get(field) or '').removesuffix(eodms_datetime_suffix)
+        rows.append((collection, str(record['recordId']), start, *[float(b) if b is not None else None for b in bounds], fetched, json.dumps(record, default=str)))
+
+    with catalog:
+        catalog.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    print(str(len(rows)) + ' records added to the catalog')
+
+
+
+###
+### READING RECORDS ###
+###
+
+# full metadata of the records of a collection for a time period/region of interest (no network access)
+#   - date_start/date_end: 'yyyymmdd_hhmmss' (None for no limit)
+#   - roi: EODMSRAPI features, e.g. [('intersects', 'Polygon ((...))')] (None for everywhere)
+#   - fields: fields to keep (None for all); exclude: field > values to drop (see eodms_harvest.is_excluded)
+#   - returns RecordColumns (one row per record, in date order)
+def read_records(catalog, collection, date_start=None, date_end=None, roi=None, fields=None, exclude=None):
+    query = 'SELECT metadata FROM records WHERE collection = ?'
+    params = [collection]
+    if date_start is not None:
+        query += ' AND start >= ?'
+        params.append(datetime.strptime(date_start, eodms_date_fmt).strftime(eodms_datetime_fmt))
+    if date_end is not None:
+        query += ' AND start <= ?'
+        params.append(datetime.strptime(date_end, eodms_date_fmt).strftime(eodms_datetime_fmt))
+
+    # pre-select on the bounding boxes (not for 'disjoint with': records outside the bounding box match too)
+    regions = [(operator, shapely.from_wkt(wkt)) for operator, wkt in (roi or [])]
+    for operator, region in regions:
+        if operator not in roi_operators:
+            raise ValueError('Unknown region of interest operator (use ' + ', '.join(roi_operators) + '): ' + operator)
+        if operator != 'disjoint with':
+            minx, miny, maxx, maxy = shapely.bounds(region)
+            query += ' AND maxx >= ? AND minx <= ? AND maxy >= ? AND miny <= ?'
+            params += [float(minx), float(maxx), float(miny), float(maxy)]
+
+    # one record at a time from the database into the columns (the footprints are always kept, for the operators)
+    records = RecordColumns(set(fields) | {'wktGeometry'} if fields is not None else None)
+    for (metadata,) in catalog.execute(query + ' ORDER BY start, recordId', params):
+        record = json.loads(metadata)
+        if not is_excluded(record, exclude):
+            records.append(record)
+
+    # apply the operators to the footprints
+    if len(regions) > 0 and len(records) > 0:
+        footprints = shapely.from_wkt([wkt or None for wkt in records.columns.get('wktGeometry', [None] * len(records))])
+        keep = ~shapely.is_missing(footprints)
+        for operator, region in regions:
+            keep &= roi_operators[operator](footprints, region)
+        records = records.take(keep)
+
+    print(str(len(records)) + ' records read from the catalog')
+    return records
@@ -0,0 +1,269 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Harvesting EODMS (RADARSAT) metadata for any time period with adaptive date windows
+#   - one EODMS search can fail (e.g. time out) or be cut off at the maximum number of results if the time period is too
+#     long, so the time period is searched in date windows:
+#       - a window that fails or hits the result cap is split in half & searched again, until it works
+#       - a window with few results means a sparse period, so the next window is made twice as long
+#   - the window size adapts to the density of the collection, so every collection/region needs about the fewest searches
+#     possible without hand-tuned (e.g. monthly) splits
+#   - records that show up in 2 windows (at the window boundaries) are only kept once
+#   - two-phase harvest (harvest_new): the windows are searched for brief results only (fields returned by the search
+#     itself); records that are already known (by recordId) or not relevant (e.g. segmentQuality 'Problem') are dropped,
+#     & the full metadata (one request per record) is only fetched for the records that are left
+#   - checkpoints (optional): the results of each window are saved to disk as soon as they arrive & the status of each
+#     window is kept in a manifest; after a crash/interruption, the harvest resumes after the last completed window
+#     (with the window size it had reached) & the results are put together from the checkpoints
+
+### CHECKPOINT FILES ###
+# <checkpoint_dir>/<sha256 of the search>/manifest.json: search, window size & windows (start, end, status, number of
+#     records, file); status is 'searching' while a window is searched & 'complete' once its results are saved
+# <checkpoint_dir>/<sha256 of the search>/window_<start>_<end>.json: results of one window
+
+### LIMITATIONS ###
+# - a window can't be split below min_window; if it still fails, the harvest stops with an error
+# - checkpoints are kept until remove_checkpoints() is called (e.g. once the output is written); until then, running
+#   the same search again re-uses them instead of searching EODMS
+
+###########################################################################
+
+import json
+import os
+import shutil
+
+from datetime import datetime
+from datetime import timedelta
+
+from query_cache import query_key
+
+
+
+###
+### SETTINGS ###
+###
+
+# date format used by EODMS
+eodms_date_fmt = '%Y%m%d_%H%M%S'
+
+# maximum number of results asked for per search; a search that returns this many was probably cut off
+result_cap = 1000
+
+# window sizes: first window, smallest & largest window
+initial_window = timedelta(days=30)
+min_window = timedelta(hours=1)
+max_window = timedelta(days=366)
+
+# a window with fewer results than this fraction of the cap is 'sparse'; the next window is twice as long
+sparse_fraction = 0.25
+
+
+
+###
+### SEARCHING ###
+###
+
+# search one date window; returns the number of results, or None if the search failed or hit the result cap
+#   - results are cleared before the search (the EODMSRAPI adds the results of every search to the previous ones), so
+#     afterwards rapi.get_results() only gives the results of this window
+#   - the number of results is counted from the (brief) results of the window, not taken from what rapi.search()
+#     returns; only exceptions & error results ({'errors': ...}, or None instead of a list) count as failed searches
+#   - result_fields: fields to add to the (brief) results of the search, e.g. to filter on before fetching the full metadata
+def search_window(rapi, collection, roi, start, end, filters=None, result_fields=None):
+    rapi.clear_results()
+    dates = [{'start': start.strftime(eodms_date_fmt), 'end': end.strftime(eodms_date_fmt)}]
+    try:
+        response = rapi.search(collection, filters=filters, features=roi, dates=dates, result_fields=result_fields, max_results=result_cap)
+        results = rapi.get_results('brief')
+    except Exception as e:
+        print('... search failed: ' + str(e))
+        return None
+
+    # no results at all (None, not an empty list) means the EODMSRAPI hit an error
+    if results is None:
+        print('... search failed: ' + str(rapi.get_err_msg() if hasattr(rapi, 'get_err_msg') else 'no results'))
+        return None
+    errors = [result['errors'] for result in results if isinstance(result, dict) and 'errors' in result]
+    if isinstance(response, dict) and 'errors' in response:
+        errors.append(response['errors'])
+    if len(errors) > 0:
+        print('... search failed: ' + str(errors[0]))
+        return None
+
+    count = len(results)
+    if count >= result_cap:
+        return None
+    return count
+
+
+# keep the first copy of each record (by recordId)
+def unique_records(results):
+    seen = set()
+    return [record for record in results if not (str(record['recordId']) in seen or seen.add(str(record['recordId'])))]
+
+
+
+###
+### CHECKPOINTS ###
+###
+
+manifest_name = 'manifest.json'
+
+
+# folder with the checkpoints of one search
+def checkpoint_path(checkpoint_dir, collection, roi, date_start, date_end, filters=None, form='full', result_fields=None):
+    key = query_key(collection=collection, roi=roi, date_start=date_start, date_end=date_end, filters=filters, form=form, result_fields=result_fields)
+    return os.path.join(checkpoint_dir, key)
+
+
+# written to a temporary file first, so a crash never leaves a partial file behind
+def write_json(path, data):
+    tmp = path + '.tmp' + str(os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# completed windows of a search (in date order) & the window size reached; ([], None) if there are no checkpoints
+def read_manifest(path):
+    manifest_file = os.path.join(path, manifest_name)
+    if not os.path.exists(manifest_file):
+        return [], None
+    manifest = read_json(manifest_file)
+    windows = [window for window in manifest['windows'] if window['status'] == 'complete']
+    return windows, timedelta(seconds=manifest['window_seconds'])
+
+
+def write_manifest(path, windows, window):
+    write_json(os.path.join(path, manifest_name), {'window_seconds': window.total_seconds(), 'windows': windows})
+
+
+# save the results of a completed window & mark it as complete
+def save_window(path, windows, window, start, end, records):
+    name = 'window_' + start.strftime(eodms_date_fmt) + '_' + end.strftime(eodms_date_fmt) + '.json'
+    write_json(os.path.join(path, name), records)
+    windows[-1] = {'start': start.strftime(eodms_date_fmt), 'end': end.strftime(eodms_date_fmt), 'status': 'complete', 'records': len(records), 'file': name}
+    write_manifest(path, windows, window)
+
+
+# remove the checkpoints of a search (same arguments as harvest)
+def remove_checkpoints(checkpoint_dir, collection, roi, date_start, date_end, filters=None, form='full', result_fields=None):
+    path = checkpoint_path(checkpoint_dir, collection, roi, date_start, date_end, filters, form, result_fields)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+
+###
+### HARVESTING ###
+###
+
+# metadata for a whole time period, searched in adaptive date windows
+#   - date_start/date_end: 'yyyymmdd_hhmmss'
+#   - form: format of the results (see rapi.get_results); 'full' fetches the full metadata of each record
+#   - result_fields: fields to add to the search results (see search_window)
+#   - checkpoint_dir: folder to save the results of each window in (see CHECKPOINT FILES); None for no checkpoints
+#   - returns one dict per record (unique by recordId), in date order
+def harvest(rapi, collection, roi, date_start, date_end, filters=None, form='full', window=initial_window, checkpoint_dir=None, result_fields=None):
+    start = datetime.strptime(date_start, eodms_date_fmt)
+    end = datetime.strptime(date_end, eodms_date_fmt)
+
+    # resume after the last completed window
+    results = []
+    windows = []
+    if checkpoint_dir is not None:
+        path = checkpoint_path(checkpoint_dir, collection, roi, date_start, date_end, filters, form, result_fields)
+        os.makedirs(path, exist_ok=True)
+        windows, saved_window = read_manifest(path)
+        for completed in windows:
+            results += read_json(os.path.join(path, completed['file']))
+        if len(windows) > 0:
+            start = datetime.strptime(windows[-1]['end'], eodms_date_fmt) + timedelta(seconds=1)
+            window = saved_window
+            print('Resuming after ' + str(len(windows)) + ' completed windows (' + str(len(results)) + ' records), from ' + str(start))
+
+    n_searches = 0
+    while start <= end:
+        window_end = min(start + window, end)
+        if checkpoint_dir is not None:
+            windows.append({'start': start.strftime(eodms_date_fmt), 'end': window_end.strftime(eodms_date_fmt), 'status': 'searching'})
+            write_manifest(path, windows, window)
+        count = search_window(rapi, collection, roi, start, window_end, filters, result_fields)
+        n_searches += 1
+
+        # failed or cut off: split the window
+        if count is None:
+            if window / 2 < min_window:
+                raise RuntimeError('EODMS search keeps failing for ' + str(start) + ' - ' + str(window_end) + ', even with the smallest window')
+            window = window / 2
+            print('... splitting the window: ' + str(window))
+            if checkpoint_dir is not None:
+                windows.pop()
+            continue
+
+        print('... ' + str(start) + ' - ' + str(window_end) + ': ' + str(count) + ' records')
+        records = rapi.get_results(form) if count > 0 else []
+        results += records
+
+        # sparse: make the next window longer
+        if count < sparse_fraction * result_cap:
+            window = min(window * 2, max_window)
+        if checkpoint_dir is not None:
+            save_window(path, windows, window, start, window_end, records)
+        start = window_end + timedelta(seconds=1)
+
+    print(str(n_searches) + ' searches')
+    return unique_records(results)
+
+
+
+###
+### TWO-PHASE HARVESTING ###
+###
+
+# exclude: field > values to drop (e.g. {'segmentQuality': ['Problem']}); records without the field are kept
+def is_excluded(record, exclude=None):
+    return exclude is not None and any(record.get(field) in values for field, values in exclude.items())
+
+
+# records that aren't known yet (by recordId) & aren't excluded
+def select_records(records, known_ids=(), exclude=None):
+    known_ids = set(str(record_id) for record_id in known_ids)
+    return [record for record in records if str(record['recordId']) not in known_ids and not is_excluded(record, exclude)]
+
+
+# hand a list of records to the EODMSRAPI as the results of a search
+#   - written against eodms_rapi 1.10.4, which has no public way to fetch the full metadata of given records (only of
+#     the results of the last search, or one record at a time with get_record): search() stores the records in
+#     rapi.results & resets the cached metadata (rapi.res_mdata); get_results('full') then fetches the metadata of each
+#     record in rapi.results (thisRecordUrl) with concurrent requests
+#   - this is the only place the EODMSRAPI attributes are used; check it when updating eodms_rapi
+def set_rapi_results(rapi, records):
+    rapi.clear_results()
+    rapi.results = list(records)
+    rapi.res_mdata = None
+
+
+# full metadata for a list of (brief) records, fetched the same way (& with the same concurrent requests) as
+# rapi.get_results('full') does for a whole search
+def fetch_full(rapi, records):
+    if len(records) == 0:
+        return []
+    set_rapi_results(rapi, records)
+    return [record for record in rapi.get_results('full') if record is not None]
+
+
+# two-phase harvest: brief results for the whole time period first, then the full metadata of the new & relevant
+# records only (see harvest & select_records for the arguments); returns the full metadata of those records
+def harvest_new(rapi, collection, roi, date_start, date_end, known_ids=(), exclude=None, filters=None, result_fields=None, window=initial_window, checkpoint_dir=None):
+    brief = harvest(rapi, collection, roi, date_start, date_end, filters=filters, form='brief', window=window, checkpoint_dir=checkpoint_dir, result_fields=result_fields)
+    selected = select_records(brief, known_ids, exclude)
+    print(str(len(brief)) + ' records found; fetching the full metadata of ' + str(len(selected)) + ' new/relevant records')
+    return fetch_full(rapi, selected)
@@ -0,0 +1,80 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Converting EODMS (RADARSAT) results to typed columns, using one schema per collection
+#   - the EODMSRAPI returns every value as a string (numbers included; missing values are empty strings '')
+#   - each collection declares the type of its fields & its timestamps; the whole result set is converted column by
+#     column once the DataFrame is built (no loop over the records)
+#   - empty strings become nulls (NaN/NaT); integer fields with nulls use the nullable integer type
+#   - timestamps: the ' +0000' suffix is stripped (it's the same for all records) & the timestamp is added as a new
+#     column (e.g. startDate > starttime); timestamps stay datetimes (only written as strings to shapefiles)
+
+###########################################################################
+
+import pandas as pd
+
+
+
+###
+### SCHEMAS ###
+###
+
+# format of EODMS timestamps (once the suffix is stripped)
+eodms_datetime_fmt = '%Y-%m-%dT%H:%M:%S'
+eodms_datetime_suffix = ' +0000'
+
+# collection > {'fields': field > 'int'/'float', 'timestamps': field > new datetime column}
+eodms_schemas = {
+    'Radarsat1': {
+        'fields': {'recordId': 'int', 'incidenceAngle': 'float', 'absoluteOrbit': 'float', 'spatialResolution': 'int'},
+        'timestamps': {'startDate': 'starttime'},
+    },
+    'Radarsat2RawProducts': {
+        'fields': {'recordId': 'int', 'incidenceAngle': 'int', 'absoluteOrbit': 'float', 'spatialResolution': 'int'},
+        'timestamps': {'startDate': 'starttime'},
+    },
+    'RCMImageProducts': {
+        'fields': {'recordId': 'int', 'incidenceAngle': 'int', 'numberOfAzimuthLooks': 'int', 'numberOfRangeLooks': 'int',
+                   'spatialResolution': 'int', 'sampledPixelSpacing': 'float', 'geodeticTerrainHeight': 'float',
+                   'relativeOrbit': 'int', 'absoluteOrbit': 'float', 'beamModeDefinitionId': 'float'},
+        'timestamps': {'acquisitionStartDate': 'starttime', 'acquisitionEndDate': 'endtime'},
+    },
+}
+
+
+
+###
+### CONVERSION ###
+###
+
+# strings > numbers ('' > null)
+def as_number(values, dtype):
+    numbers = pd.to_numeric(values.replace('', None))
+    if dtype == 'int':
+        return numbers.astype('int64') if not numbers.isna().any() else numbers.astype('Int64')
+    return numbers.astype('float64')
+
+
+# strings > timestamps ('' > NaT); returns the stripped strings & the timestamps
+def as_timestamp(values):
+    stripped = values.fillna('').str.removesuffix(eodms_datetime_suffix)
+    return stripped, pd.to_datetime(stripped.replace('', None), format=eodms_datetime_fmt)
+
+
+# convert the columns of a DataFrame of EODMS results with the schema of their collection; fields that aren't in the
+# DataFrame (e.g. not in parameters_pass) are skipped
+def convert_records(df, collection):
+    if collection not in eodms_schemas:
+        raise ValueError('No schema for EODMS collection (add it to eodms_schemas): ' + collection)
+    schema = eodms_schemas[collection]
+
+    df = df.copy()
+    for field, dtype in schema['fields'].items():
+        if field in df.columns:
+            df[field] = as_number(df[field], dtype)
+    for field, column in schema['timestamps'].items():
+        if field in df.columns:
+            df[field], df[column] = as_timestamp(df[field])
+    return df
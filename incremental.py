@@ -0,0 +1,109 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Incremental updates of metadata outputs
+#   - keeps a small state file next to an output, recording what has been processed so far
+#       - watermark: latest date processed (e.g. 'Date Acquired' for LANDSAT, 'ingestiondate' for Sentinel)
+#       - keys: identifiers already in the output(s) (e.g. product identifiers)
+#       - settings: the time period/region of interest etc. the output was made for; if these change, the state is ignored
+#   - on the next run only the new/changed records need processing; they're upserted into the existing output(s)
+
+### STATE FILE ###
+# <output filename without extension>_state.json
+
+###########################################################################
+
+import json
+import os
+
+import pandas as pd
+import geopandas as gpd
+
+from metadata_io import storage_format, read_metadata, parse_datetimes
+
+
+
+###
+### STATE FILE ###
+###
+
+def state_file(outfile):
+    return os.path.splitext(outfile)[0] + '_state.json'
+
+
+# read the state recorded for an output; None if there isn't one or it was made with different settings
+def read_state(outfile, settings):
+    path = state_file(outfile)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        state = json.load(f)
+
+    # compared as they're stored (e.g. tuples become lists)
+    if state.get('settings') != json.loads(json.dumps(settings)):
+        print('Settings changed since the last run; processing everything again')
+        return None
+    return state
+
+
+# record the state of an output
+#   - keys: dict of name > identifiers (e.g. one set per level/group)
+#   - columns: the columns as they were written, if they aren't known in advance (e.g. they depend on the query results)
+def write_state(outfile, settings, watermark, keys, columns=None):
+    state = {
+        'settings': settings,
+        'watermark': None if watermark is None or pd.isna(watermark) else str(watermark),
+        'keys': {name: sorted(str(key) for key in values) for name, values in keys.items()},
+    }
+    if columns is not None:
+        state['columns'] = list(columns)
+    with open(state_file(outfile), 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+# identifiers recorded in a state for one name (empty set if there's no state)
+def state_keys(state, name):
+    if state is None:
+        return set()
+    return set(state['keys'].get(name, []))
+
+
+
+###
+### EXISTING OUTPUTS ###
+###
+
+# read an existing output back with its original (untruncated) column names (any storage format, see metadata_io.py)
+#   - shapefile field names are cut to 10 characters, but the column order is kept, so the names can be put back by position
+#   - columns: the columns as they were written (geometry included, in any position)
+#   - datetime_columns: parsed back into timestamps if they were written as strings (shapefiles)
+#   - returns None if the file doesn't exist or doesn't match the columns
+def read_output(outfile, columns, datetime_columns=()):
+    if not os.path.exists(outfile):
+        return None
+
+    data = read_metadata(outfile)
+    attributes = [column for column in columns if column != 'geometry']
+    if storage_format(outfile) == 'shapefile' and len(data.columns) == len(attributes) + 1:
+        data.columns = attributes + ['geometry']
+        data = data.set_geometry('geometry')
+
+    if set(data.columns) != set(columns):
+        print('Existing output does not match the parameters of interest; processing everything again: ', outfile)
+        return None
+    return parse_datetimes(data[columns], datetime_columns)
+
+
+# update/insert records: records in new replace the existing records with the same key; everything else is kept
+def upsert(existing, new, key):
+    if existing is None or len(existing) == 0:
+        return new.reset_index(drop=True)
+    if len(new) == 0:
+        return existing.reset_index(drop=True)
+
+    kept = existing.loc[~existing[key].isin(new[key])]
+    crs = new.crs if new.crs is not None else existing.crs
+    return gpd.GeoDataFrame(pd.concat([kept, new], ignore_index=True), geometry='geometry', crs=crs)
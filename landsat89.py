@@ -41,13 +41,18 @@
 ###########################################################################
 
 import pandas as pd
-import geopandas as gpd
 import matplotlib.pyplot as plt
 
-from shapely.geometry import Polygon
 from shapely.geometry import Point
 from datetime import datetime
 from datetime import date
+from datetime import timedelta
+
+from incremental import read_state, write_state, state_keys, read_output, upsert
+from metadata_io import write_metadata
+from landsat_metadata import merge_levels, date_acquired_fmt
+from landsat_parallel import read_landsat_levels
+from roi_filter import read_roi
 
 
 
@@ -69,12 +74,36 @@ roi = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/ROIs/GreatLakes_ex
 infile_LANDSAT_Level1 = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data_landsat8/LANDSAT_OT_C2_L1-2_downloaded-07-nov-2022.csv'
 infile_LANDSAT_Level2 = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data_landsat8/LANDSAT_OT_C2_L2-2_downloaded-07-nov-2022.csv'
 
-# output filename
+# folder for the parquet cache of the LANDSAT metadata files (built on the first run, re-used until the csv files change)
+#   set to None to read the csv files directly every time
+cache_dir = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data_landsat8/cache/'
+
+# file for the cache of footprints per WRS path/row (the ROI test then only runs once per path/row instead of once per scene)
+#   set to None to test every scene's footprint
+wrs_cache_file = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data_landsat8/cache/wrs_footprints.parquet'
+
+# number of processes used to filter the metadata (1 = no parallel processing)
+workers = 8
+
+# incremental updates: only process records that aren't in the existing outputs yet (new or reprocessed scenes) and update
+#   the existing outputs with them; set to False to process everything from scratch
+#   - only scenes acquired from reprocessing_slack_days before the latest acquisition date of the last run (watermark)
+#     are read again; scenes reprocessed or added late within the slack get new product identifiers & are picked up,
+#     older ones need a run from scratch
+incremental = True
+reprocessing_slack_days = 30
+
+# output filenames; the storage format follows the extension (.shp, .gpkg or .parquet)
 outfile_merge = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/data_github_test/LANDSAT-8-9_data_Level_1-2_merge_' + date_start + '_' + date_end + '_' + roi_shortname+ '.shp'
 
 outfile_level1 = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/data_github_test/LANDSAT-8-9_data_Level_1_' + date_start + '_' + date_end + '_' + roi_shortname+ '.shp'
 outfile_level2 = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/data_github_test/LANDSAT-8-9_data_Level_2_' + date_start + '_' + date_end + '_' + roi_shortname+ '.shp'
 
+# how to merge Level-1 & Level-2 data in the merged file
+#   'scene': one record per scene with both product identifiers (about half the file size; ArcGIS Online limit is 10 MB)
+#   'stack': one record per product (Level 1 & Level 2 records for the same scene are both kept)
+merge_mode = 'scene'
+
 # parameters of interest; different parameters for Level-1 and Level-2 data
 parameter_pass_L1 = ['Landsat Product Identifier L1', 'Landsat Scene Identifier', 'Date Acquired', 'Collection Category', 'Collection Number', 'WRS Path', 'WRS Row', 'Nadir/Off Nadir', 'Land Cloud Cover', 'Scene Cloud Cover L1', 'Start Time', 'Stop Time', 'Station Identifier', 'Day/Night Indicator', 'Sun Elevation L0RA', 'Sun Azimuth L0RA', 'Data Type L1', 'Sensor Identifier', 'Product Map Projection L1', 'UTM Zone', 'Ellipsoid', 'geometry', 'Satellite']
 
@@ -86,142 +115,98 @@ parameter_pass_L2 = ['Landsat Product Identifier L2', 'Landsat Product Identifie
 ### SCRIPT START ###
 ###
 
-roi_gpd = gpd.read_file(roi)
+roi_gpd = read_roi(roi)
 
 
 
 ###
-### IMPORT LEVEL-1 DATA ###
+### INCREMENTAL UPDATES ###
 ###
-print('Reading LANDSAT Level 1 metadata...')
-data_level_1 = pd.read_csv(infile_LANDSAT_Level1)
+
+# what was processed in the last run (product identifiers already in the outputs & latest acquisition date)
+#   only valid if the outputs were made with the same settings and still exist
+incremental_settings = {'date_start': date_start, 'date_end': date_end, 'roi': roi, 'parameter_pass_L1': parameter_pass_L1, 'parameter_pass_L2': parameter_pass_L2}
+state = read_state(outfile_merge, incremental_settings) if incremental else None
+
+existing_level_1 = read_output(outfile_level1, parameter_pass_L1) if state is not None else None
+existing_level_2 = read_output(outfile_level2, parameter_pass_L2) if state is not None else None
+if existing_level_1 is None or existing_level_2 is None:
+    state = None
+    existing_level_1 = None
+    existing_level_2 = None
+else:
+    print('Incremental update; last run processed data up to: ' + str(state['watermark']))
+
+known_ids = [state_keys(state, 'level_1'), state_keys(state, 'level_2')]
+
+# incremental: scenes acquired before the watermark (minus the slack) aren't read at all
+read_start = date_start
+if state is not None and state['watermark'] is not None:
+    slack_start = datetime.strptime(state['watermark'], date_acquired_fmt) - timedelta(days=reprocessing_slack_days)
+    read_start = max(date_start, slack_start.strftime('%Y-%m-%d'))
+    print('Reading scenes acquired from ' + read_start)
+
 
 
+###
+### IMPORT LEVEL-1 & LEVEL-2 DATA ###
+###
+
+# this is literally every scene that LANDSAT-8 has ever collected... 
+### downloaded from: https://www.usgs.gov/core-science-systems/nli/landsat/bulk-metadata-service
+print('Reading LANDSAT Level 1 & Level 2 metadata...')
+
 ###
 ### FILTERING ###
 ###
 
-### filter to time period of interest
-data_level_1['Date Acquired_datetime'] = pd.to_datetime(data_level_1['Date Acquired'], format='%Y/%m/%d')   # convert to datetime
-data_level_1 = data_level_1.loc[(data_level_1['Date Acquired_datetime'] >= date_start) & (data_level_1['Date Acquired_datetime'] < date_end)]
-data_level_1 = data_level_1.reset_index(drop=True)
-
-
-### filter to study area
-# metadata doesn't have a geometry column; it has multiple columns with the nodes for the extent
-# create geometry column from provided information 
-geometry_lst = [None]*len(data_level_1)
-geometry_wkt = [None]*len(data_level_1)
-for i in range(len(data_level_1)):
-    
-    # reassign the values to make things more legible... 
-    ULY = data_level_1['Corner Upper Left Latitude'][i]
-    ULX = data_level_1['Corner Upper Left Longitude'][i]
-    URY = data_level_1['Corner Upper Right Latitude'][i]
-    URX = data_level_1['Corner Upper Right Longitude'][i]
-    LLY = data_level_1['Corner Lower Left Latitude'][i]
-    LLX = data_level_1['Corner Lower Left Longitude'][i]
-    LRY = data_level_1['Corner Lower Right Latitude'][i]
-    LRX = data_level_1['Corner Lower Right Longitude'][i]
-    
-    geometry_lst[i] = [[ULX, ULY], [URX, URY], [LRX, LRY], [LLX, LLY], [ULX, ULY]]
-    geometry_wkt[i] = Polygon(geometry_lst[i])
-    
-    # this take a while, so keep track of progress
-    if i in list(range(10000, len(data_level_1), 10000)):
-        print(str(i) + '/' + str(len(data_level_1)) + ' records processed')
-
-
-# assign the geometry columns to the existing dataframe
-data_level_1 = data_level_1.assign(geometry_lst = geometry_lst)
-data_level_1 = data_level_1.assign(geometry_wkt = geometry_wkt)
-
-# convert to GeoPandas
-data_level_1_gpd = gpd.GeoDataFrame(data_level_1, geometry = data_level_1['geometry_wkt'])
-data_level_1_gpd = data_level_1_gpd.set_crs('EPSG:4326')
-
-# FILTER TO STUDY AREA
-intersection = gpd.overlay(roi_gpd, data_level_1_gpd, how='intersection')
-data_level_1_subset_gpd = data_level_1_gpd.loc[data_level_1_gpd['Landsat Scene Identifier'].isin(intersection['Landsat Scene Identifier'])]
+# FILTER TO DESIRED TIMELINE & STUDY AREA
+#   - read through the parquet cache if there is one: only the year/month partitions, columns and records of interest
+#     are read, and the footprints are already built (metadata doesn't have a geometry column; it has columns with the
+#     corners of the extent); without a cache the csv is split into row ranges and each range is filtered separately
+#   - study area: spatial index query (intersects); only need to know which scenes touch the study area, not the intersection polygons
+#   - Level 1 and Level 2 are processed at the same time, spread over 'workers' processes (one month of the cache or
+#     one row range of the csv per job)
+levels = [(infile_LANDSAT_Level1, parameter_pass_L1), (infile_LANDSAT_Level2, parameter_pass_L2)]
+#   - study area through the WRS path/row cache: scenes of a path/row that's clearly inside/outside the study area aren't tested one by one
+#   - incremental: only scenes acquired from read_start are read; records already in the outputs are skipped (known_ids)
+data_level_1_subset_gpd, data_level_2_subset_gpd = read_landsat_levels(levels, read_start, date_end, roi_gpd, workers=workers, cache_dir=cache_dir, known_ids=known_ids, wrs_cache_file=wrs_cache_file)
 
-data_level_1_subset_gpd = data_level_1_subset_gpd.reset_index(drop=True)
-data_level_1_subset_gpd = data_level_1_subset_gpd[parameter_pass_L1]
 
 
-# write LANDSAT Level 1 metadata to file
-data_level_1_subset_gpd.to_file(outfile_level1)
+###
+### LEVEL-1 DATA ###
+###
 
+data_level_1_subset_gpd = data_level_1_subset_gpd.reset_index(drop=True)
+data_level_1_subset_gpd = data_level_1_subset_gpd[parameter_pass_L1]
 
+# incremental: add the new records to the existing ones (a reprocessed scene replaces its old record)
+print(str(len(data_level_1_subset_gpd)) + ' new/updated Level 1 records')
+data_level_1_subset_gpd = upsert(existing_level_1, data_level_1_subset_gpd, 'Landsat Scene Identifier')
 
 
+# write LANDSAT Level 1 metadata to file
+write_metadata(data_level_1_subset_gpd, outfile_level1)
 
-###
-### IMPORT LEVEL-2 DATA ###
-###
 
 
-# this is literally every scene that LANDSAT-8 has ever collected... 
-### downloaded from: https://www.usgs.gov/core-science-systems/nli/landsat/bulk-metadata-service
-print('Reading LANDSAT Level 2 metadata...')
-data_level_2 = pd.read_csv(infile_LANDSAT_Level2)
 
-# investigate the columns 
-#headers = data.columns
 
 ###
-### FILTERING ###
+### LEVEL-2 DATA ###
 ###
 
-# FILTER TO DESIRED TIMELINE
-# need to convert the date to datetime64
-data_level_2['Date Acquired_datetime'] = pd.to_datetime(data_level_2['Date Acquired'], format='%Y/%m/%d')
-data_level_2 = data_level_2.loc[(data_level_2['Date Acquired_datetime'] >= date_start) & (data_level_2['Date Acquired_datetime'] < date_end)]
-
-data_level_2 = data_level_2.reset_index(drop=True)
-
-
-### FILTER TO STUDY AREA 
-# create geometry column from provided information 
-geometry_lst = [None]*len(data_level_2) # column with list of coordinates
-geometry_wkt = [None]*len(data_level_2) # column for the actual new geometry cokunb
-for i in range(len(data_level_2)):
-    
-    # reassign the values to make things more legible... 
-    ULY = data_level_2['Corner Upper Left Latitude'][i]
-    ULX = data_level_2['Corner Upper Left Longitude'][i]
-    URY = data_level_2['Corner Upper Right Latitude'][i]
-    URX = data_level_2['Corner Upper Right Longitude'][i]
-    LLY = data_level_2['Corner Lower Left Latitude'][i]
-    LLX = data_level_2['Corner Lower Left Longitude'][i]
-    LRY = data_level_2['Corner Lower Right Latitude'][i]
-    LRX = data_level_2['Corner Lower Right Longitude'][i]
-    
-    geometry_lst[i] = [[ULX, ULY], [URX, URY], [LRX, LRY], [LLX, LLY], [ULX, ULY]]
-    geometry_wkt[i] = Polygon(geometry_lst[i])
-    
-    # this takes a while, so keep track of progress
-    if i in list(range(10000, len(data_level_2), 10000)):
-        print(str(i) + '/' + str(len(data_level_2)) + ' records processed')
-
-
-# assign the geometry columns to the existing dataframe
-data_level_2 = data_level_2.assign(geometry_lst = geometry_lst)
-data_level_2 = data_level_2.assign(geometry_wkt = geometry_wkt)
-
-# convert to GeoPandas
-data_level_2_gpd = gpd.GeoDataFrame(data_level_2, geometry = data_level_2['geometry_wkt'])
-data_level_2_gpd = data_level_2_gpd.set_crs('EPSG:4326')
-
-# FILTER TO STUDY AREA
-intersection = gpd.overlay(roi_gpd, data_level_2_gpd, how='intersection')
-data_level_2_subset_gpd = data_level_2_gpd.loc[data_level_2_gpd['Landsat Scene Identifier'].isin(intersection['Landsat Scene Identifier'])]
-
 data_level_2_subset_gpd = data_level_2_subset_gpd.reset_index(drop=True)
 data_level_2_subset_gpd = data_level_2_subset_gpd[parameter_pass_L2]
 
+# incremental: add the new records to the existing ones (a reprocessed scene replaces its old record)
+print(str(len(data_level_2_subset_gpd)) + ' new/updated Level 2 records')
+data_level_2_subset_gpd = upsert(existing_level_2, data_level_2_subset_gpd, 'Landsat Scene Identifier')
+
 
 # write LANDSAT Level 2 metadata to file
-data_level_2_subset_gpd.to_file(outfile_level2)
+write_metadata(data_level_2_subset_gpd, outfile_level2)
 
 
 
@@ -232,30 +217,16 @@ data_level_2_subset_gpd.to_file(outfile_level2)
 ### CHECK CONSISTENCY BETWEEN LEVEL-1 AND LEVEL-2 DATA ###
 ###
 
-# rename columns that I want to merge together... & make columns that I want...
-data_level_1_subset_gpd = data_level_1_subset_gpd.rename(columns={'Data Type L1': 'Data Type'})
-data_level_2_subset_gpd = data_level_2_subset_gpd.rename(columns={'Data Type L2': 'Data Type'})
-data_level_1_subset_gpd['Product Level'] = 'Level 1' 
-data_level_2_subset_gpd['Product Level'] = 'Level 2' 
-
-
 # merge data & consistency analysis 
-data_merge = pd.concat([data_level_1_subset_gpd, data_level_2_subset_gpd])
-data_merge = data_merge.reset_index(drop=True)
-
-
-# add/replace/delete/rename data to make them compatible for making the data summary file (update fields)
+#   - 'scene': one record per scene, joining Level 1 & Level 2 on the Level 1 product identifier (has_L1/has_L2 flag which levels exist)
+#   - 'stack': one record per product (Level 1 records followed by Level 2 records)
 #   need to also combine the file names since it's a merged file of Level 1 & level 2 data
 #   if the data is level 2, use that filename only
-#   column names max 10 characters (it'll be truncated to 10 when exporting anyways)
-data_merge['filename'] = ''
-for i in range(len(data_merge)):
-    if pd.isna(data_merge['Landsat Product Identifier L2'][i]):
-        data_merge['filename'][i] = data_merge['Landsat Product Identifier L1'][i]
-    else:
-        data_merge['filename'][i] = data_merge['Landsat Product Identifier L2'][i]
+data_merge = merge_levels(data_level_1_subset_gpd, data_level_2_subset_gpd, how=merge_mode)
 
 
+# add/replace/delete/rename data to make them compatible for making the data summary file (update fields)
+#   column names max 10 characters (it'll be truncated to 10 when exporting anyways)
 data_merge['mission'] = 'LANDSAT'
 data_merge = data_merge.replace({'Satellite': {8:'LANDSAT-8', 9:'LANDSAT-9'}})
 data_merge = data_merge.drop('Collection Number', axis=1)
@@ -265,7 +236,11 @@ data_merge.rename(columns={'Landsat Scene Identifier':'sceneid', 'Scene Cloud Co
 ###
 ### OUTPUT MERGED FILE
 ###
-data_merge.to_file(outfile_merge)
+write_metadata(data_merge, outfile_merge)
+
+# record what has been processed, for the next incremental update
+watermark = pd.concat([data_level_1_subset_gpd['Date Acquired'], data_level_2_subset_gpd['Date Acquired']]).max()
+write_state(outfile_merge, incremental_settings, watermark, {'level_1': data_level_1_subset_gpd['Landsat Product Identifier L1'], 'level_2': data_level_2_subset_gpd['Landsat Product Identifier L2']})
 
 
 
@@ -0,0 +1,255 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Columnar (parquet) cache of the LANDSAT-8/9 bulk metadata files
+#   - the first run converts a bulk metadata csv into a parquet dataset, partitioned by acquisition year/month
+#       - typed columns (see landsat_metadata.bulk_dtypes)
+#       - footprints are built once and stored as WKB, along with their bounding box
+#   - later runs only read the partitions/columns/rows they need instead of re-parsing the csv
+#   - the cache is rebuilt automatically when the csv changes (size, modification time, hash)
+
+### CACHE LAYOUT ###
+# <cache_dir>/<csv filename without extension>/
+#   - manifest.json                      (information about the csv the cache was built from)
+#   - year=YYYY/month=M/<part>.parquet   (the data)
+
+###########################################################################
+
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
+
+from landsat_metadata import bulk_dtypes, date_acquired_fmt, build_footprints, read_bulk_metadata, product_id_column
+
+
+
+###
+### CACHE SETTINGS ###
+###
+
+# bump this if the layout of the cache changes; older caches are rebuilt
+cache_version = 2
+
+manifest_filename = 'manifest.json'
+
+# extra columns stored in the cache (on top of the bulk file's own columns)
+geometry_column = 'geometry_wkb'
+row_column = 'source_row'   # row number in the csv, so records can be read back in file order
+bbox_columns = ['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy']
+partition_columns = ['year', 'month']
+
+# arrow types for the dtypes used in landsat_metadata.bulk_dtypes; any column without a known dtype is stored as a string
+arrow_types = {'str': pa.string(), 'float64': pa.float64(), 'int64': pa.int64(), 'Int64': pa.int64()}
+
+
+
+###
+### SOURCE FILE FINGERPRINT ###
+###
+
+# sha256 of a file, read in blocks so multi-GB files don't need to fit in memory
+def file_hash(infile, blocksize=8*1024*1024):
+    sha = hashlib.sha256()
+    with open(infile, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def file_fingerprint(infile):
+    stat = os.stat(infile)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def cache_path(infile, cache_dir):
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(infile))[0])
+
+
+def read_manifest(path):
+    manifest_file = os.path.join(path, manifest_filename)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file) as f:
+        return json.load(f)
+
+
+# check if the cache still matches the csv
+#   - different size > stale
+#   - same size & modification time > valid (no need to hash a multi-GB file)
+#   - same size but different modification time > compare hashes; the file may just have been touched/copied
+def cache_is_valid(infile, path):
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get('version') != cache_version:
+        return False
+
+    fingerprint = file_fingerprint(infile)
+    if fingerprint['size'] != manifest['size']:
+        return False
+    if fingerprint['mtime_ns'] == manifest['mtime_ns']:
+        return True
+
+    if file_hash(infile) != manifest['sha256']:
+        return False
+
+    # same content; record the new modification time so the next run doesn't have to hash again
+    manifest['mtime_ns'] = fingerprint['mtime_ns']
+    with open(os.path.join(path, manifest_filename), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return True
+
+
+
+###
+### BUILDING THE CACHE ###
+###
+
+def cache_schema(columns, dtypes):
+    fields = [pa.field(column, arrow_types[dtypes[column]]) for column in columns]
+    fields.append(pa.field('Date Acquired_datetime', pa.timestamp('ns')))
+    fields.append(pa.field(geometry_column, pa.binary()))
+    fields.append(pa.field(row_column, pa.int64()))
+    fields += [pa.field(column, pa.float64()) for column in bbox_columns]
+    fields += [pa.field(column, pa.int32()) for column in partition_columns]
+    return pa.schema(fields)
+
+
+# convert one chunk of the csv into the layout of the cache
+def cache_chunk(chunk, first_row=0):
+    chunk[row_column] = range(first_row, first_row + len(chunk))
+    chunk['Date Acquired_datetime'] = pd.to_datetime(chunk['Date Acquired'], format=date_acquired_fmt).astype('datetime64[ns]')
+
+    footprints = build_footprints(chunk, progress_step=len(chunk) + 1)
+    chunk[geometry_column] = shapely.to_wkb(footprints.values)
+    chunk[bbox_columns] = footprints.bounds.to_numpy()
+
+    chunk['year'] = chunk['Date Acquired_datetime'].dt.year.astype('int32')
+    chunk['month'] = chunk['Date Acquired_datetime'].dt.month.astype('int32')
+    return chunk
+
+
+# convert a bulk metadata csv into the parquet cache (all columns, all records)
+#   - written to a temporary folder first, so an interrupted build never looks like a valid cache
+def build_cache(infile, path, chunksize=250000):
+    print('Building parquet cache for ' + os.path.basename(infile) + ' (one-time conversion)...')
+
+    columns = list(pd.read_csv(infile, nrows=0).columns)
+    dtypes = {column: bulk_dtypes.get(column, 'str') for column in columns}
+    schema = cache_schema(columns, dtypes)
+
+    path_tmp = path + '.tmp'
+    if os.path.exists(path_tmp):
+        shutil.rmtree(path_tmp)
+
+    n_read = 0
+    for chunk in pd.read_csv(infile, dtype=dtypes, chunksize=chunksize):
+        table = pa.Table.from_pandas(cache_chunk(chunk, first_row=n_read), schema=schema, preserve_index=False)
+        pq.write_to_dataset(table, path_tmp, partition_cols=partition_columns)
+
+        n_read += len(chunk)
+        print(str(n_read) + ' records cached')
+
+    manifest = file_fingerprint(infile)
+    manifest['sha256'] = file_hash(infile)
+    manifest['version'] = cache_version
+    manifest['source'] = os.path.abspath(infile)
+    with open(os.path.join(path_tmp, manifest_filename), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(path_tmp, path)
+
+
+# build the cache for a csv if it doesn't exist yet or is out of date; returns the path to the cache
+def ensure_cache(infile, cache_dir):
+    path = cache_path(infile, cache_dir)
+    if not cache_is_valid(infile, path):
+        build_cache(infile, path)
+    return path
+
+
+
+###
+### READING FROM THE CACHE ###
+###
+
+# filter expression for the time period (& bounding box) of interest
+#   - the year/month part only touches the partition folders, so partitions outside the time period are never opened
+#   - known_ids: product identifiers (in id_column) that were already processed and are skipped
+def cache_filter(date_start, date_end, bounds=None, known_ids=None, id_column=None):
+    start = pd.Timestamp(date_start)
+    end = pd.Timestamp(date_end)
+
+    year = ds.field('year')
+    month = ds.field('month')
+    expression = ((year > start.year) | ((year == start.year) & (month >= start.month))) & \
+                 ((year < end.year) | ((year == end.year) & (month <= end.month)))
+
+    expression &= (ds.field('Date Acquired_datetime') >= start.to_pydatetime()) & (ds.field('Date Acquired_datetime') < end.to_pydatetime())
+
+    if bounds is not None:
+        minx, miny, maxx, maxy = bounds
+        expression &= (ds.field('bbox_maxx') >= minx) & (ds.field('bbox_minx') <= maxx) & \
+                      (ds.field('bbox_maxy') >= miny) & (ds.field('bbox_miny') <= maxy)
+
+    if known_ids:
+        expression &= ~ds.field(id_column).isin(pa.array(sorted(known_ids), type=pa.string()))
+    return expression
+
+
+# the time period split at the start of each month, so each part only touches one year/month partition (for reading
+# the partitions in parallel); returns a list of (start, end)
+def month_windows(date_start, date_end):
+    start = pd.Timestamp(date_start)
+    end = pd.Timestamp(date_end)
+    boundaries = [start] + [month for month in pd.date_range(start, end, freq='MS') if start < month < end] + [end]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+# read the records of interest from the cache as a GeoDataFrame (footprints already built)
+#   - only the partitions, columns and rows that are needed are read
+#   - records come back in the same order as in the csv (the partitions themselves are read in folder order)
+#   - row_numbers: keep the row numbers in the csv (row_column), to put several reads back in file order
+#   - arrow > pandas conversion splits the columns & frees the arrow buffers as it goes, to avoid holding two copies
+def read_cache(path, parameter_pass, date_start, date_end, bounds=None, known_ids=None, crs='EPSG:4326', row_numbers=False):
+    columns = [parameter for parameter in parameter_pass if parameter != 'geometry']
+    columns += ['Date Acquired_datetime', geometry_column, row_column]
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive', ignore_prefixes=['.', '_', manifest_filename])
+    table = dataset.to_table(columns=columns, filter=cache_filter(date_start, date_end, bounds, known_ids, product_id_column(columns)))
+    table = table.sort_by(row_column)
+    if not row_numbers:
+        table = table.drop_columns([row_column])
+    data = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+
+    geometry = gpd.GeoSeries.from_wkb(data.pop(geometry_column), crs=crs)
+    return gpd.GeoDataFrame(data, geometry=geometry, crs=crs)
+
+
+
+###
+### ENTRY POINT FOR THE LANDSAT SCRIPT ###
+###
+
+# read the records of interest from a bulk metadata csv as a GeoDataFrame
+#   - with a cache_dir: read through the parquet cache (building/refreshing it first if needed)
+#   - without: stream the csv directly (see landsat_metadata.read_bulk_metadata)
+#   - known_ids: product identifiers that were already processed (incremental updates); these records are skipped
+def read_landsat_metadata(infile, parameter_pass, date_start, date_end, bounds=None, known_ids=None, cache_dir=None):
+    if cache_dir is None:
+        data = read_bulk_metadata(infile, parameter_pass, date_start, date_end, bounds=bounds, known_ids=known_ids)
+        return gpd.GeoDataFrame(data, geometry=build_footprints(data), crs='EPSG:4326')
+
+    path = ensure_cache(infile, cache_dir)
+    return read_cache(path, parameter_pass, date_start, date_end, bounds=bounds, known_ids=known_ids)
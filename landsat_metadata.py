@@ -0,0 +1,216 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Shared helpers for working with the LANDSAT-8/9 bulk metadata files
+#   - the bulk metadata is downloaded from: https://www.usgs.gov/core-science-systems/nli/landsat/bulk-metadata-service
+#   - used by landsat89.py for both the Level-1 and Level-2 files
+
+###########################################################################
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+
+
+###
+### BULK METADATA COLUMNS ###
+###
+
+# the metadata doesn't have a geometry column; it has 4 corners (lon/lat) for the extent of each scene
+# ordered so that the polygon goes UL > UR > LR > LL (same as the original per-row loop)
+corner_lon_columns = ['Corner Upper Left Longitude', 'Corner Upper Right Longitude', 'Corner Lower Right Longitude', 'Corner Lower Left Longitude']
+corner_lat_columns = ['Corner Upper Left Latitude', 'Corner Upper Right Latitude', 'Corner Lower Right Latitude', 'Corner Lower Left Latitude']
+corner_columns = corner_lon_columns + corner_lat_columns
+
+# format of the 'Date Acquired' column
+date_acquired_fmt = '%Y/%m/%d'
+
+# explicit dtypes for the columns that we read; anything not listed here is left for pandas to work out
+#   - text columns are kept as strings so pandas doesn't have to guess per chunk
+bulk_dtypes = {
+    'Landsat Product Identifier L1': 'str',
+    'Landsat Product Identifier L2': 'str',
+    'Landsat Scene Identifier': 'str',
+    'Date Acquired': 'str',
+    'Collection Category': 'str',
+    'Collection Number': 'int64',
+    'WRS Path': 'int64',
+    'WRS Row': 'int64',
+    'Target WRS Path': 'int64',
+    'Target WRS Row': 'int64',
+    'Nadir/Off Nadir': 'str',
+    'Land Cloud Cover': 'float64',
+    'Scene Cloud Cover L1': 'float64',
+    'Start Time': 'str',
+    'Stop Time': 'str',
+    'Station Identifier': 'str',
+    'Day/Night Indicator': 'str',
+    'Sun Elevation L0RA': 'float64',
+    'Sun Azimuth L0RA': 'float64',
+    'Data Type L1': 'str',
+    'Data Type L2': 'str',
+    'Sensor Identifier': 'str',
+    'Product Map Projection L1': 'str',
+    'UTM Zone': 'Int64',   # empty for scenes that aren't in UTM (e.g. polar stereographic)
+    'Ellipsoid': 'str',
+    'Satellite': 'int64',
+}
+bulk_dtypes.update({column: 'float64' for column in corner_columns})
+
+
+
+###
+### READING THE BULK METADATA ###
+###
+
+# columns to read from the bulk file for a given list of parameters of interest
+#   - 'geometry' isn't in the file; it's built from the corner columns
+def bulk_columns(parameter_pass):
+    columns = [parameter for parameter in parameter_pass if parameter != 'geometry']
+    columns += [column for column in corner_columns if column not in columns]
+    return columns
+
+
+# True for every scene whose corners fall (at least partly) inside a bounding box (minx, miny, maxx, maxy)
+#   - cheap prefilter only; the exact test against the region of interest is done on the footprints
+#   - scenes crossing the antimeridian get a very wide box, so they are kept rather than lost
+def corners_in_bounds(data, bounds):
+    minx, miny, maxx, maxy = bounds
+    lon = data[corner_lon_columns].to_numpy(dtype='float64')
+    lat = data[corner_lat_columns].to_numpy(dtype='float64')
+    return (lon.max(axis=1) >= minx) & (lon.min(axis=1) <= maxx) & (lat.max(axis=1) >= miny) & (lat.min(axis=1) <= maxy)
+
+
+# column with the product identifier of a level (Level-2 files list both the Level-1 and Level-2 identifiers)
+def product_id_column(columns):
+    if 'Landsat Product Identifier L2' in columns:
+        return 'Landsat Product Identifier L2'
+    return 'Landsat Product Identifier L1'
+
+
+# apply the time period of interest (and optionally a bounding box) to one block of records
+#   - known_ids: product identifiers that were already processed (incremental updates); these records are skipped
+def filter_bulk_chunk(chunk, date_start, date_end, bounds=None, known_ids=None):
+    chunk['Date Acquired_datetime'] = pd.to_datetime(chunk['Date Acquired'], format=date_acquired_fmt)
+    keep = (chunk['Date Acquired_datetime'] >= date_start) & (chunk['Date Acquired_datetime'] < date_end)
+    if bounds is not None:
+        keep &= corners_in_bounds(chunk, bounds)
+    if known_ids:
+        keep &= ~chunk[product_id_column(chunk.columns)].isin(known_ids)
+    return chunk.loc[keep]
+
+
+# read a LANDSAT bulk metadata file (csv) in chunks, keeping only the records of interest
+#   - only the parameters of interest + corner columns are read, with explicit dtypes
+#   - every chunk is filtered to the time period (and bounding box of the region of interest) before the next one is read
+#     so memory scales with the number of matching records rather than the size of the archive
+def read_bulk_metadata(infile, parameter_pass, date_start, date_end, bounds=None, known_ids=None, chunksize=250000):
+    columns = bulk_columns(parameter_pass)
+    dtypes = {column: bulk_dtypes[column] for column in columns if column in bulk_dtypes}
+
+    subsets = []
+    n_read = 0
+    n_kept = 0
+    for chunk in pd.read_csv(infile, usecols=columns, dtype=dtypes, chunksize=chunksize):
+        subset = filter_bulk_chunk(chunk, date_start, date_end, bounds, known_ids)
+        subsets.append(subset)
+
+        n_read += len(chunk)
+        n_kept += len(subset)
+        print(str(n_read) + ' records read, ' + str(n_kept) + ' kept')
+
+    data = pd.concat(subsets, ignore_index=True)
+    return data
+
+
+
+###
+### FOOTPRINTS ###
+###
+
+# build the footprint polygon of every scene from the corner columns
+#   - the corners are pulled out as one (n, 5, 2) array and handed to shapely in one call per block
+#   - progress is printed once per block of progress_step records (not checked per record)
+#   - returns a GeoSeries aligned with the index of data
+def build_footprints(data, crs='EPSG:4326', progress_step=10000):
+    n_records = len(data)
+
+    coords = np.empty((n_records, 5, 2), dtype='float64')
+    coords[:, :4, 0] = data[corner_lon_columns].to_numpy(dtype='float64')
+    coords[:, :4, 1] = data[corner_lat_columns].to_numpy(dtype='float64')
+    coords[:, 4, :] = coords[:, 0, :]   # close the ring
+
+    geometry = np.empty(n_records, dtype=object)
+    for i in range(0, n_records, progress_step):
+        geometry[i:i + progress_step] = shapely.polygons(coords[i:i + progress_step])
+        if i > 0:
+            print(str(i) + '/' + str(n_records) + ' records processed')
+
+    return gpd.GeoSeries(geometry, index=data.index, crs=crs)
+
+
+
+###
+### MERGING LEVEL-1 & LEVEL-2 ###
+###
+
+# key shared by both levels; Level-2 products list the Level-1 product they were made from
+level_key = 'Landsat Product Identifier L1'
+
+
+# combine one column from the Level-1 (suffix _L1) and Level-2 sides of a join; Level-2 wins where both have a value
+def coalesce_levels(data, column):
+    column_l1 = column + '_L1'
+    if isinstance(data[column].dtype, gpd.array.GeometryDtype):
+        values = np.where(data[column].isna(), data[column_l1].values, data[column].values)
+        data[column] = gpd.GeoSeries(values, index=data.index)
+    else:
+        data[column] = data[column].combine_first(data[column_l1])
+    return data.drop(columns=column_l1)
+
+
+# merge the Level-1 and Level-2 metadata
+#   how = 'scene': one record per scene (outer join on the Level-1 product identifier)
+#       - attributes/footprint are taken from Level-2 where available, otherwise Level-1
+#       - both product identifiers are kept, with flags for which levels are available (has_L1, has_L2)
+#       - about half the size of 'stack', since the footprint & most attributes aren't repeated
+#   how = 'stack': one record per product (Level-1 records followed by Level-2 records)
+#   either way, 'filename' is the Level-2 product identifier if there is one, otherwise the Level-1 one
+def merge_levels(data_level_1, data_level_2, how='scene'):
+    data_level_1 = data_level_1.rename(columns={'Data Type L1': 'Data Type'})
+    data_level_2 = data_level_2.rename(columns={'Data Type L2': 'Data Type'})
+    crs = data_level_1.crs if data_level_1.crs is not None else data_level_2.crs
+
+    if how == 'stack':
+        data_level_1['Product Level'] = 'Level 1'
+        data_level_2['Product Level'] = 'Level 2'
+        data_merge = pd.concat([data_level_1, data_level_2], ignore_index=True)
+
+    elif how == 'scene':
+        data_level_2 = data_level_2.drop_duplicates(level_key)
+        data_merge = pd.DataFrame(data_level_1).merge(pd.DataFrame(data_level_2), on=level_key, how='outer', suffixes=('_L1', ''), indicator=True)
+        for column in data_level_1.columns:
+            if column != level_key and column + '_L1' in data_merge.columns:
+                data_merge = coalesce_levels(data_merge, column)
+
+            # the outer join turns integer columns into floats; put them back if every scene has a value
+            if pd.api.types.is_integer_dtype(data_level_1[column].dtype) and data_merge[column].notna().all():
+                data_merge[column] = data_merge[column].astype(data_level_1[column].dtype)
+
+        data_merge['has_L1'] = data_merge['_merge'].isin(['both', 'left_only']).astype('int64')
+        data_merge['has_L2'] = data_merge['_merge'].isin(['both', 'right_only']).astype('int64')
+        data_merge['Product Level'] = np.where(data_merge['has_L2'] == 1, 'Level 2', 'Level 1')
+        data_merge = data_merge.drop(columns='_merge')
+
+    else:
+        raise ValueError("how must be 'scene' or 'stack', not: " + str(how))
+
+    if 'Landsat Product Identifier L2' not in data_merge.columns:
+        data_merge['Landsat Product Identifier L2'] = np.nan
+    data_merge['filename'] = data_merge['Landsat Product Identifier L2'].fillna(data_merge[level_key])
+
+    return gpd.GeoDataFrame(data_merge, geometry='geometry', crs=crs)
@@ -0,0 +1,164 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Multi-core filtering of the LANDSAT-8/9 bulk metadata files
+#   - each bulk csv is split into row ranges (byte ranges that start/end on a line break)
+#   - each worker process reads its range and applies the time period, footprint construction and ROI filter
+#   - the results are put back together in file order, so the output doesn't depend on which worker finishes first
+#   - with the parquet cache, each file is read one month (year/month partition) per worker instead
+#   - Level-1 and Level-2 files go into the same process pool, so both are processed at the same time
+#   - optionally, the ROI filter goes through the WRS path/row footprint cache (see wrs_cache.py)
+
+### LIMITATIONS ###
+# - the byte ranges assume there are no line breaks inside quoted fields (true for the USGS bulk metadata files)
+# - worker processes are started with 'fork', since the scripts in this repo run at the top level and can't be
+#   re-imported safely by 'spawn'; where 'fork' isn't available (Windows) everything runs in the main process
+
+###########################################################################
+
+import io
+import multiprocessing
+import os
+
+import pandas as pd
+import geopandas as gpd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from landsat_metadata import bulk_columns, bulk_dtypes, filter_bulk_chunk, build_footprints
+from landsat_cache import read_landsat_metadata, ensure_cache, month_windows, read_cache, row_column
+from roi_filter import filter_to_roi
+from wrs_cache import read_wrs_cache, write_wrs_cache, update_wrs_cache, filter_to_roi_wrs
+
+
+
+###
+### SPLITTING THE FILE ###
+###
+
+# split a csv into (start, end) byte ranges of roughly equal size, each starting at the beginning of a line
+#   - returns the header line as well, since only the first range has it
+def byte_ranges(infile, n_ranges):
+    size = os.path.getsize(infile)
+    with open(infile, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+
+        boundaries = [data_start]
+        for k in range(1, n_ranges):
+            f.seek(data_start + (size - data_start) * k // n_ranges)
+            f.readline()   # move to the start of the next full line
+            boundaries.append(f.tell())
+        boundaries.append(size)
+
+    boundaries = sorted(set(boundaries))
+    return header, list(zip(boundaries[:-1], boundaries[1:]))
+
+
+
+###
+### WORK DONE BY EACH PROCESS ###
+###
+
+# ROI filter, through the WRS path/row cache if there is one
+#   - returns the subset & the summary of path/rows to add to the cache (None without a cache)
+def roi_subset(data_gpd, roi_gpd, wrs=None):
+    if wrs is None:
+        return filter_to_roi(data_gpd, roi_gpd), None
+    return filter_to_roi_wrs(data_gpd, roi_gpd, wrs)
+
+
+# time period + footprints + ROI filter for one byte range of a bulk metadata csv
+def filter_byte_range(infile, header, start, end, parameter_pass, date_start, date_end, roi_gpd, known_ids=None, wrs=None):
+    with open(infile, 'rb') as f:
+        f.seek(start)
+        block = f.read(end - start)
+
+    columns = bulk_columns(parameter_pass)
+    dtypes = {column: bulk_dtypes[column] for column in columns if column in bulk_dtypes}
+    data = pd.read_csv(io.BytesIO(header + block), usecols=columns, dtype=dtypes)
+    del block
+
+    data = filter_bulk_chunk(data, date_start, date_end, bounds=roi_gpd.total_bounds, known_ids=known_ids)
+    data_gpd = gpd.GeoDataFrame(data, geometry=build_footprints(data), crs='EPSG:4326')
+    return roi_subset(data_gpd, roi_gpd, wrs)
+
+
+# time period + ROI filter for a whole file
+#   - read through the parquet cache if there is one (footprints are already in the cache), otherwise the csv is streamed
+def filter_file(infile, parameter_pass, date_start, date_end, roi_gpd, cache_dir, known_ids=None, wrs=None):
+    data_gpd = read_landsat_metadata(infile, parameter_pass, date_start, date_end, bounds=roi_gpd.total_bounds, known_ids=known_ids, cache_dir=cache_dir)
+    return roi_subset(data_gpd, roi_gpd, wrs)
+
+
+# time period + ROI filter for one month of a parquet cache (see landsat_cache.month_windows); the row numbers are kept
+# to put the months back in file order
+def filter_cache_month(path, parameter_pass, date_start, date_end, roi_gpd, known_ids=None, wrs=None):
+    data_gpd = read_cache(path, parameter_pass, date_start, date_end, bounds=roi_gpd.total_bounds, known_ids=known_ids, row_numbers=True)
+    return roi_subset(data_gpd, roi_gpd, wrs)
+
+
+# records of a level read month by month, back in file order
+def in_file_order(data_gpd):
+    return data_gpd.sort_values(row_column, kind='stable').drop(columns=row_column).reset_index(drop=True)
+
+
+
+###
+### RUNNING THE WORK ###
+###
+
+def process_pool(workers):
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+
+
+# read & filter several LANDSAT metadata files (e.g. Level-1 and Level-2) at the same time
+#   - levels: list of (infile, parameter_pass)
+#   - returns one GeoDataFrame per level (same order as levels), filtered to the time period & region of interest
+#   - with a cache_dir, each level is split into one job per month of the time period (one year/month partition each);
+#     the cache is built/refreshed first, in the main process
+#   - without, each level is split into workers*ranges_per_worker row ranges, so the load is spread evenly
+#   - known_ids: one set of already processed product identifiers per level (or None); these records are skipped
+#   - wrs_cache_file: WRS path/row footprint cache used for the ROI filter (and updated with new path/rows); None to not use it
+def read_landsat_levels(levels, date_start, date_end, roi_gpd, workers=1, cache_dir=None, known_ids=None, wrs_cache_file=None, ranges_per_worker=4):
+    if known_ids is None:
+        known_ids = [None] * len(levels)
+    wrs = read_wrs_cache(wrs_cache_file) if wrs_cache_file is not None else None
+
+    pool = process_pool(workers)
+    if pool is None:
+        print('Filtering LANDSAT metadata in a single process...')
+        outputs = [[filter_file(infile, parameter_pass, date_start, date_end, roi_gpd, cache_dir, level_known_ids, wrs)] for (infile, parameter_pass), level_known_ids in zip(levels, known_ids)]
+
+    else:
+        print('Filtering LANDSAT metadata with ' + str(workers) + ' processes...')
+        with pool:
+            jobs = []
+            for (infile, parameter_pass), level_known_ids in zip(levels, known_ids):
+                if cache_dir is not None:
+                    path = ensure_cache(infile, cache_dir)
+                    jobs.append([pool.submit(filter_cache_month, path, parameter_pass, month_start, month_end, roi_gpd, level_known_ids, wrs) for month_start, month_end in month_windows(date_start, date_end)])
+                    continue
+
+                header, ranges = byte_ranges(infile, workers * ranges_per_worker)
+                jobs.append([pool.submit(filter_byte_range, infile, header, start, end, parameter_pass, date_start, date_end, roi_gpd, level_known_ids, wrs) for start, end in ranges])
+
+            outputs = [[future.result() for future in futures] for futures in jobs]
+
+    results = []
+    summaries = []
+    for (infile, parameter_pass), level_outputs in zip(levels, outputs):
+        results.append(pd.concat([subset for subset, summary in level_outputs], ignore_index=True))
+        if row_column in results[-1].columns:
+            results[-1] = in_file_order(results[-1])
+        summaries += [summary for subset, summary in level_outputs]
+        print(os.path.basename(infile) + ': ' + str(len(results[-1])) + ' records kept')
+
+    if wrs is not None:
+        write_wrs_cache(update_wrs_cache(wrs, summaries), wrs_cache_file)
+
+    return results
@@ -0,0 +1,188 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Reading/writing metadata outputs in the storage format given by the file extension
+#   - .shp: ESRI Shapefile (ArcGIS Online)
+#       - datetimes aren't supported, so datetime columns are written as strings (datetime_format); this is the only place
+#         datetimes are formatted
+#       - column names are cut to 10 characters
+#   - .gpkg: GeoPackage; .parquet: GeoParquet
+#       - datetimes are stored as native timestamps & column names are kept as they are
+#   - when reading, datetime columns are parsed back from strings only if they were stored as strings (shapefiles), so the
+#     rest of the pipeline can always work with timestamps (e.g. date filters are plain comparisons)
+#   - shapefile_columns() gives the names a column would have in a shapefile, so scripts written for shapefile inputs
+#     (e.g. the summary scripts) work with any storage format
+#   - shapefiles/GeoPackages are read & written through GDAL with Arrow (pyogrio), which moves whole columns at once
+#     instead of one feature at a time
+#   - reads can be limited to some columns, a time window & a bounding box; the limits are passed on to GDAL/Arrow, so
+#     the other columns & records are never decoded (GeoParquet files are written with a bounding box column for this)
+
+###########################################################################
+
+import json
+import os
+
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyogrio
+
+
+
+###
+### SETTINGS ###
+###
+
+# format of datetimes written as strings (shapefiles)
+datetime_format = '%Y-%m-%d %H:%M:%S.%f'
+
+# file extension > storage format
+storage_formats = {'.shp': 'shapefile', '.gpkg': 'geopackage', '.parquet': 'geoparquet'}
+
+
+
+###
+### STORAGE FORMATS ###
+###
+
+def storage_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in storage_formats:
+        raise ValueError('Unsupported output format (use ' + ', '.join(storage_formats) + '): ' + path)
+    return storage_formats[ext]
+
+
+# names the columns get when written to a shapefile (same rules as GDAL: cut to 10 characters; repeated names get
+# a _1, _2, ... suffix)
+def shapefile_columns(columns):
+    names = []
+    for column in columns:
+        name = column[:10]
+        k = 1
+        while name in names:
+            suffix = '_' + str(k)
+            name = column[:10 - len(suffix)] + suffix
+            k += 1
+        names.append(name)
+    return names
+
+
+
+###
+### DATETIMES ###
+###
+
+# datetime columns written as strings (for shapefiles)
+def export_datetimes(data, fmt=datetime_format):
+    data = data.copy()
+    for column in data.columns:
+        if pd.api.types.is_datetime64_any_dtype(data[column]):
+            data[column] = data[column].dt.strftime(fmt)
+    return data
+
+
+# timestamps from a column that may hold strings (shapefiles) or timestamps already
+def as_datetime(values, fmt=datetime_format):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, format=fmt)
+
+
+# parse the datetime columns (that are present) back into timestamps
+def parse_datetimes(data, columns, fmt=datetime_format):
+    for column in columns:
+        if column in data.columns:
+            data[column] = as_datetime(data[column], fmt)
+    return data
+
+
+
+###
+### READING/WRITING ###
+###
+
+# write metadata in the storage format of outfile (datetimes as strings only for shapefiles)
+def write_metadata(data_gpd, outfile):
+    storage = storage_format(outfile)
+    if storage == 'shapefile':
+        export_datetimes(data_gpd).to_file(outfile, engine='pyogrio', use_arrow=True)
+    elif storage == 'geopackage':
+        data_gpd.to_file(outfile, driver='GPKG', engine='pyogrio', use_arrow=True)
+    else:
+        data_gpd.to_parquet(outfile, index=False, write_covering_bbox=True)
+
+
+# GeoParquet metadata of a file (geometry column, bounding box column, ...)
+def parquet_geo(infile):
+    return json.loads(pq.read_schema(infile).metadata[b'geo'])
+
+
+# columns stored in a file (geometry excluded): name > True if stored as datetimes
+def stored_columns(infile):
+    if storage_format(infile) == 'geoparquet':
+        geometry = parquet_geo(infile)['primary_column']
+        return {field.name: pa.types.is_timestamp(field.type) for field in pq.read_schema(infile) if field.name != geometry}
+    info = pyogrio.read_info(infile)
+    return {name: dtype.startswith('datetime') for name, dtype in zip(info['fields'], info['dtypes'])}
+
+
+# the bounds of a time window in the form a column is stored in: timestamps, or strings in time_format (the bounds
+# then compare the same way as the times, as long as the format goes from years to fractions of seconds)
+def window_bounds(time_window, is_datetime, time_format):
+    start, end = pd.Timestamp(time_window[1]), pd.Timestamp(time_window[2])
+    if is_datetime:
+        return start, end
+    return start.strftime(time_format), end.strftime(time_format)
+
+
+# read metadata in the storage format of infile
+#   - datetime_columns: columns parsed into timestamps if they were stored as strings
+#   - shapefile_names: rename the columns to the names they'd have in a shapefile
+#   - columns: columns to read (None for all; the geometry is always read)
+#   - time_window: (column, start, end); only records with start <= time < end are read. Column names are the names
+#     after renaming (shapefile names if shapefile_names)
+#   - time_format: format of the datetime columns & the time window column if they're stored as strings (it differs
+#     between missions, see mission_schema.read_options)
+#   - bbox: (minx, miny, maxx, maxy); only records with a footprint intersecting it are read
+def read_metadata(infile, datetime_columns=(), shapefile_names=False, columns=None, time_window=None, time_format=datetime_format, bbox=None):
+    stored = stored_columns(infile)
+    names = dict(zip(shapefile_columns(stored) if shapefile_names else stored, stored))
+    for column in (columns or []) + ([time_window[0]] if time_window is not None else []):
+        if column not in names:
+            raise ValueError('Column not in ' + infile + ': ' + column)
+    read_columns = [names[column] for column in columns] if columns is not None else None
+
+    if storage_format(infile) == 'geoparquet':
+        filters = None
+        if time_window is not None:
+            column = names[time_window[0]]
+            start, end = window_bounds(time_window, stored[column], time_format)
+            filters = [(column, '>=', start), (column, '<', end)]
+        # the bounding box column only compares bounding boxes, so the footprints are checked once they're read (files
+        # without a bounding box column, written before it was added, are only filtered then)
+        geo = parquet_geo(infile)
+        covering = 'covering' in geo['columns'][geo['primary_column']]
+        if read_columns is not None:
+            read_columns = read_columns + [geo['primary_column']]
+        data_gpd = gpd.read_parquet(infile, columns=read_columns, filters=filters, bbox=bbox if covering else None)
+        if bbox is not None:
+            data_gpd = data_gpd.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+    else:
+        where = None
+        if time_window is not None:
+            column = names[time_window[0]]
+            start, end = window_bounds(time_window, stored[column], time_format)
+            if stored[column]:
+                start, end = start.isoformat(), end.isoformat()
+            where = '"' + column + '" >= \'' + start + '\' AND "' + column + '" < \'' + end + '\''
+        data_gpd = gpd.read_file(infile, engine='pyogrio', use_arrow=True, columns=read_columns, where=where, bbox=bbox)
+
+    if shapefile_names:
+        geometry = data_gpd.geometry.name
+        short = {name: column for column, name in names.items()}
+        data_gpd.columns = [short[column] if column != geometry else column for column in data_gpd.columns]
+
+    return parse_datetimes(data_gpd.reset_index(drop=True), datetime_columns, time_format)
@@ -0,0 +1,192 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Field names & values of each mission in the web app outputs, declared once for both summary scripts
+#   - each mission declares how its input columns (shapefile names) become the web app fields:
+#       - rename: input column > web app field
+#       - values: input column > {value: new value} (e.g. platform ids > platform names)
+#       - constants: web app field > value given to every record (e.g. the mission name, when it isn't in the input)
+#       - derived: web app field > (function of the (renamed) columns, fields it's made from)
+#       - drop: input columns left out of the mission outputs
+#       - fields: web app fields kept in the data summary file
+#       - time_format: format of the start time in the input, if it isn't metadata_io.datetime_format
+#   - project_mission() builds the output in one pass: each column is picked, mapped & renamed once & the output is put
+#     together at the end (no chain of replace/drop/rename copying the whole GeoDataFrame at every step)
+#   - both summary scripts use the same declarations, so their field names & values can't drift apart
+#   - read_options() gives the input columns (& start time column) needed for some web app fields, so only those are
+#     read from the mission files, & the format datetimes are stored in (see metadata_io.read_metadata)
+
+###########################################################################
+
+import pandas as pd
+import geopandas as gpd
+
+from metadata_io import datetime_format, as_datetime
+
+
+
+###
+### DERIVED FIELDS ###
+###
+
+# LANDSAT start times: day of year (e.g. '2022:105:10:42:07.1234567'); pandas takes the 7 digits of the fractional
+# seconds with %f (datetime.strptime only takes 6)
+landsat_time_format = '%Y:%j:%H:%M:%S.%f'
+
+
+# LANDSAT start times > timestamps; start times that are timestamps already (parsed when read) are kept
+def landsat_starttime(columns):
+    return as_datetime(columns['starttime'], landsat_time_format)
+
+
+
+###
+### MISSION SCHEMAS ###
+###
+
+# field names common to the Sentinel missions (SentinelAPI metadata, see sentinel_query.py)
+sentinel_rename = {'beginposit':'starttime', 'ingestiond':'ingestion', 'orbitnumbe':'orbit_abs', 'relativeor':'orbit_rel', 'platformna':'mission', 'orbitdirec':'orbit_dir', 'producttyp':'datatype'}
+
+# mission > schema (see SHORT DESCRIPTION)
+mission_schemas = {
+    # the merged Level 1 & Level 2 output of landsat89.py already has the web app names & values (incl. the filename,
+    # Level 2 if there is one, & the mission); only the start times are converted
+    'LANDSAT': {
+        'rename': {},
+        'values': {},
+        'constants': {},
+        'derived': {'starttime': (landsat_starttime, ['starttime'])},
+        'drop': [],
+        'fields': ['filename', 'sceneid', 'Collection', 'WRS Path', 'WRS Row', 'cloudcover', 'starttime', 'Day/Night', 'sun_elev', 'sun_azim', 'datatype', 'sensorid', 'UTM Zone', 'Ellipsoid', 'mission', 'geometry', 'platform'],
+        'time_format': landsat_time_format,
+    },
+    'Sentinel-1': {
+        'rename': {**sentinel_rename, 'slicenumbe':'slice', 'sensoroper':'sensormode', 'platformid':'platform'},
+        'values': {'platformid': {'2014-016A':'Sentinel-1A', '2016-025A':'Sentinel-1B'}},
+        'constants': {},
+        'derived': {},
+        'drop': ['swathident'],
+        'fields': ['link', 'starttime', 'ingestion', 'slice', 'orbit_abs', 'orbit_rel', 'sensormode', 'orbit_dir', 'datatype', 'mission', 'platform', 'filename', 'polarisati', 'uuid', 'geometry'],
+    },
+    'Sentinel-2': {
+        'rename': {**sentinel_rename, 'platformse':'platform', 'processi_1':'proc_level'},
+        'values': {},
+        'constants': {},
+        'derived': {},
+        'drop': ['platformid', 'processing', 'producttyp'],
+        'fields': ['link', 'starttime', 'ingestion', 'orbit_abs', 'orbit_rel', 'cloudcover', 'tileid', 'mission', 'filename', 'orbit_dir', 'platform', 'proc_level', 'uuid', 'geometry'],
+    },
+    'Sentinel-3': {
+        'rename': {**sentinel_rename, 'productlev':'proc_level', 'platformid':'platform', 'relpassnum':'passnumRel', 'passnumber':'passnumAbs'},
+        'values': {'platformid': {'2016-011A':'Sentinel-3A', '0000-000A':'Sentinel-3B', '2018-039A':'Sentinel-3B'}, 'productlev': {'L1':'Level 1', 'L2':'Level 2'}},
+        'constants': {},
+        'derived': {},
+        'drop': ['link_icon', 'summary', 'identifier', 'procfacili', 'procfaci_1', 'processing'],
+        'fields': ['link', 'starttime', 'ingestion', 'orbit_abs', 'orbit_rel', 'proc_level', 'mission', 'platform', 'filename', 'datatype', 'timeliness', 'orbit_dir', 'passnumRel', 'passnumAbs', 'uuid', 'cloudcover', 'geometry'],
+    },
+    'RADARSAT-1': {
+        'rename': {'collection':'mission', 'processing':'proc_level', 'incidenceA':'angle_inc', 'orbitDirec':'orbit_dir', 'absoluteOr':'orbit_abs', 'sensorMode':'sensormode', 'downloadLi':'link', 'polarizati':'polarisati', 'productTyp':'datatype', 'title':'filename'},
+        'values': {'processing': {'l1':'Level 1'}, 'collection': {'Radarsat1':'RADARSAT-1'}},
+        'constants': {},
+        'derived': {},
+        'drop': [],
+        'fields': ['recordId', 'mission', 'proc_level', 'angle_inc', 'polarisati', 'orbit_dir', 'orbit_abs', 'spatialRes', 'beam', 'sensormode', 'lookOrient', 'lutApplied', 'filename', 'featureId', 'link', 'thisRecord', 'starttime', 'geometry', 'datatype'],
+    },
+    'RADARSAT-2': {
+        'rename': {'collection':'mission', 'incidenceA':'angle_inc', 'segmentQua':'quality', 'absoluteOr':'orbit_abs', 'polarizati':'polarisati', 'transmitPo':'polTransmt', 'sensorMode':'sensormode', 'title':'filename', 'orbitDirec':'orbit_dir'},
+        'values': {'collection': {'Radarsat2RawProducts':'RADARSAT-2'}},
+        'constants': {'datatype': 'Raw'},
+        'derived': {},
+        'drop': ['startDate', 'position', 'beam', 'wktGeometr'],
+        'fields': ['recordId', 'mission', 'angle_inc', 'quality', 'orbit_dir', 'orbit_abs', 'polarisati', 'polTransmt', 'spatialRes', 'sensormode', 'featureId', 'lookOrient', 'filename', 'starttime', 'geometry', 'datatype'],
+    },
+    'RADARSAT-CM': {
+        'rename': {'collection':'mission', 'processing':'proc_level', 'incidenceA':'angle_inc', 'numberOfAz':'AzLookNum', 'polarizati':'polarisati', 'beamModeTy':'beammode', 'orbitDirec':'orbit_dir', 'numberOfRa':'RngLookNum', 'polariza_1':'PolIn_Prod', 'sampledPix':'pxlSpacing', 'satelliteI':'platform', 'productApp':'applicatin', 'relativeOr':'orbit_rel', 'beamModeDe':'beam_mode', 'absoluteOr':'orbit_abs', 'productTyp':'datatype', 'title':'filename'},
+        'values': {'collection': {'RCMImageProducts':'RADARSAT-CM'}, 'processing': {'l1':'Level 1', 'l3':'Level 3'}, 'satelliteI': {'RCM-1':'RADARSAT-CM 1', 'RCM-2':'RADARSAT-CM 2', 'RCM-3':'RADARSAT-CM 3'}},
+        'constants': {},
+        'derived': {},
+        'drop': ['acquisitio', 'beamMnemon', 'acquisit_1', 'sensorFold', 'wktGeometr'],
+        'fields': ['recordId', 'mission', 'proc_level', 'angle_inc', 'AzLookNum', 'datatype', 'polarisati', 'beammode', 'orbit_dir', 'RngLookNum', 'spatialRes', 'PolIn_Prod', 'pxlSpacing', 'lookOrient', 'platform', 'applicatin', 'lutApplied', 'orbit_rel', 'beam_mode', 'orbit_abs', 'filename', 'featureId', 'thisRecord', 'starttime', 'geometry'],
+    },
+}
+
+
+
+###
+### PROJECTION ###
+###
+
+# the projection of a mission's input columns: list of (input column, web app field, value map or None)
+def compile_projection(mission, columns):
+    if mission not in mission_schemas:
+        raise ValueError('No schema for mission (add it to mission_schemas): ' + mission)
+    schema = mission_schemas[mission]
+
+    projection = []
+    for column in columns:
+        if column in schema['drop']:
+            continue
+        projection.append((column, schema['rename'].get(column, column), schema['values'].get(column)))
+    return projection
+
+
+# web app fields of a mission's data (see SHORT DESCRIPTION), in one pass over its columns
+#   - fields: web app fields to keep, in that order (e.g. the schema's 'fields' for the data summary file); None for all
+#     but the dropped columns
+def project_mission(data, mission, fields=None):
+    projection = compile_projection(mission, data.columns)
+    schema = mission_schemas[mission]
+
+    # each input column is mapped & renamed once (columns that aren't mapped are passed on as they are)
+    columns = {}
+    for column, name, value_map in projection:
+        columns[name] = data[column].replace(value_map) if value_map is not None else data[column]
+    for name, value in schema['constants'].items():
+        columns[name] = pd.Series(value, index=data.index)
+    for name, (function, _) in schema['derived'].items():
+        columns[name] = function(columns)
+
+    if fields is not None:
+        missing = [name for name in fields if name not in columns]
+        if len(missing) > 0:
+            raise ValueError(mission + ': fields not in the data (check the input file/mission schema): ' + ', '.join(missing))
+        columns = {name: columns[name] for name in fields}
+    return gpd.GeoDataFrame(columns, geometry=data.geometry.name, crs=data.crs)
+
+
+
+###
+### READING ###
+###
+
+# input column of a web app field
+def input_column(mission, field):
+    inputs = {name: column for column, name in mission_schemas[mission]['rename'].items() if column not in mission_schemas[mission]['drop']}
+    return inputs.get(field, field)
+
+
+# input columns needed for some web app fields (constant fields aren't read; derived fields need the fields they're
+# made from; the geometry is always read)
+def input_columns(mission, fields):
+    schema = mission_schemas[mission]
+    needed = []
+    for field in fields:
+        if field in schema['derived']:
+            needed += [input_column(mission, source) for source in schema['derived'][field][1]]
+        elif field not in schema['constants'] and field != 'geometry':
+            needed.append(input_column(mission, field))
+    return list(dict.fromkeys(needed))
+
+
+# keyword arguments for metadata_io.read_metadata to read a mission's file: datetimes stored as strings are parsed with
+# the mission's time_format, & only the input columns needed for some web app fields (None for all) & the records that
+# start in a time window (date_start <= start time < date_end) & intersect a bounding box (None for all) are read
+def read_options(mission, fields=None, date_start=None, date_end=None, bbox=None):
+    options = {'time_format': mission_schemas[mission].get('time_format', datetime_format), 'bbox': bbox}
+    if fields is not None:
+        options['columns'] = input_columns(mission, fields)
+    if date_start is not None and date_end is not None:
+        options['time_window'] = (input_column(mission, 'starttime'), date_start, date_end)
+    return options
@@ -0,0 +1,237 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Parallel paging of Copernicus OpenSearch queries (the API behind SentinelAPI.query)
+#   - SentinelAPI.query fetches the result pages (100 products each) one after the other, so large queries spend most of
+#     their time waiting on round trips
+#   - here the first page is fetched on its own to learn the total number of results; all the other pages are then
+#     fetched at the same time and put back together in order
+#   - all requests go through one HTTP session with a pool of keep-alive connections; the pool size caps the number of
+#     requests in flight (a request waits for a free connection)
+#   - results are ordered by ingestion date on the server, so products ingested while the pages are being fetched go to
+#     the end of the results instead of shifting the pages; products that still show up twice are only kept once
+#   - the query string is built & the response is converted the same way as SentinelAPI.query (OrderedDict of uuid >
+#     product), but here (format_query, parse_entries), so this module doesn't need sentinelsat (or its private parser,
+#     which can change between versions)
+#   - api_url can point to any server answering OpenSearch requests (e.g. a local stand-in server for testing)
+
+###########################################################################
+
+import re
+import time
+
+import requests
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+
+
+
+###
+### SETTINGS ###
+###
+
+# maximum number of results per page accepted by the API
+page_size = 100
+
+# order of the results on the server (keeps the pages stable while new products are ingested)
+order_by = 'ingestiondate asc'
+
+# number of attempts for each page & wait (seconds) before the first retry (doubles after each attempt)
+attempts = 3
+retry_wait = 1
+
+
+
+###
+### HTTP SESSION ###
+###
+
+# session with a pool of keep-alive connections shared by all threads
+#   - connections: maximum number of requests in flight; further requests wait for a free connection
+def opensearch_session(username, password, connections=8):
+    session = requests.Session()
+    session.auth = (username, password)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+
+###
+### QUERY STRING ###
+###
+
+# keywords whose values are date ranges
+date_keywords = {'beginposition', 'endposition', 'date', 'creationdate', 'ingestiondate'}
+
+
+# a date bound of a query: dates/datetimes & 'YYYYMMDD' strings > 'YYYY-MM-DDThh:mm:ssZ'; None > '*' (unbounded);
+# other strings (e.g. 'NOW-1DAY', '2021-05-01T00:00:00Z') are passed on as they are
+def format_date(value):
+    if value is None:
+        return '*'
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    value = value.strip()
+    if re.fullmatch(r'\d{8}', value):
+        return datetime.strptime(value, '%Y%m%d').strftime('%Y-%m-%dT%H:%M:%SZ')
+    return value
+
+
+# one keyword value of a query (None if the keyword is left out)
+#   - strings are quoted, unless they're Solr syntax already (brackets, quotes, wildcards)
+#   - (low, high) ranges become '[low TO high]' (None or '*' for an unbounded side); date ranges are formatted first
+def format_value(keyword, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            raise ValueError('Empty query value for ' + keyword)
+        if not any(value.startswith(s[0]) and value.endswith(s[1]) for s in ['[]', '{}', '//', '()', '""']) and '*' not in value and '?' not in value:
+            value = '"' + re.sub(r'\s', ' ', value) + '"'
+
+    is_date = keyword.lower() in date_keywords
+    if is_date and not (isinstance(value, str) and ' TO ' in value):
+        if not (isinstance(value, (list, tuple)) and len(value) == 2):
+            raise ValueError('Date query value for ' + keyword + ' must be (start, end) or a \'[<start> TO <end>]\' string: ' + str(value))
+        value = (format_date(value[0]), format_date(value[1]))
+
+    if isinstance(value, (list, tuple)):
+        if len(value) != 2:
+            raise ValueError('Query range for ' + keyword + ' must have 2 values: ' + str(value))
+        bounds = ['*' if bound in (None, '*') else '"' + str(bound) + '"' for bound in value]
+        if bounds == ['*', '*'] or (is_date and bounds == ['*', 'NOW']):
+            return None
+        value = '[' + bounds[0] + ' TO ' + bounds[1] + ']'
+    return value
+
+
+# OpenSearch query string for a footprint (WKT), a date range of the start times & other keywords, the same as
+# SentinelAPI.format_query(area, date, **keywords) (keywords in alphabetical order, sets are OR-ed)
+def format_query(area=None, date=None, **keywords):
+    if len({keyword.lower() for keyword in keywords}) != len(keywords) or (date is not None and 'beginposition' in {keyword.lower() for keyword in keywords}):
+        raise ValueError('Query contains duplicate keywords (keywords are case-insensitive)')
+    if date is not None:
+        keywords['beginPosition'] = date
+
+    parts = []
+    for keyword, value in sorted(keywords.items()):
+        if isinstance(value, set):
+            if len(value) > 0:
+                options = [format_value(keyword, option) for option in value]
+                parts.append('(' + ' OR '.join(sorted(keyword + ':' + str(option) for option in options if option is not None)) + ')')
+            continue
+        value = format_value(keyword, value)
+        if value is not None:
+            parts.append(keyword + ':' + str(value))
+
+    if area is not None:
+        parts.append('footprint:"Intersects(' + area + ')"')
+    return ' '.join(parts)
+
+
+
+###
+### PAGES ###
+###
+
+# one page of results: (list of entries, total number of results)
+def search_page(session, api_url, query, offset, rows=page_size):
+    url = urljoin(api_url if api_url.endswith('/') else api_url + '/', 'search')
+    params = {'format': 'json', 'rows': rows, 'start': offset, 'orderby': order_by, 'q': query.encode('latin1')}
+
+    for attempt in range(attempts):
+        try:
+            response = session.get(url, params=params)
+            response.raise_for_status()
+            feed = response.json()['feed']
+            break
+        except (requests.RequestException, ValueError, KeyError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(retry_wait * 2 ** attempt)
+
+    if 'error' in feed:
+        raise ValueError('OpenSearch query failed: ' + str(feed['error'].get('message')))
+
+    entries = feed.get('entry', [])
+    if isinstance(entries, dict):   # a single product isn't returned as a list
+        entries = [entries]
+    return entries, int(feed['opensearch:totalResults'])
+
+
+# all the results of an OpenSearch query string; pages after the first are fetched by up to 'connections' threads
+def search_all(session, api_url, query, connections=8):
+    entries, total = search_page(session, api_url, query, 0)
+
+    offsets = list(range(page_size, total, page_size))
+    if len(offsets) > 0:
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            pages = pool.map(lambda offset: search_page(session, api_url, query, offset)[0], offsets)
+            for page in pages:
+                entries += page
+
+    # drop products that show up twice (e.g. if the results changed between pages)
+    seen = set()
+    entries = [entry for entry in entries if not (entry['id'] in seen or seen.add(entry['id']))]
+    return entries, total
+
+
+
+###
+### RESPONSE ###
+###
+
+# OpenSearch dates, e.g. '2021-05-01T10:42:07.123Z'
+def parse_date(content):
+    return datetime.strptime(content, '%Y-%m-%dT%H:%M:%S.%fZ' if '.' in content else '%Y-%m-%dT%H:%M:%SZ')
+
+
+# value types of the OpenSearch entries > conversion (other types, e.g. 'str', are kept as strings)
+converters = {'date': parse_date, 'int': int, 'long': int, 'float': float, 'double': float}
+
+
+# entries > OrderedDict of uuid > product (property > value), same as SentinelAPI.query
+#   - each entry holds its properties grouped by type ({'name': ..., 'content': ...}; a single property isn't in a list)
+#   - links become 'link' & 'link_<rel>'
+def parse_entries(entries):
+    products = OrderedDict()
+    for entry in entries:
+        product = products[entry['id']] = {}
+        for key, properties in entry.items():
+            if key == 'id':
+                continue
+            if isinstance(properties, str):
+                product[key] = properties
+                continue
+            if isinstance(properties, dict):
+                properties = [properties]
+            if key == 'link':
+                for p in properties:
+                    product['link_' + p['rel'] if 'rel' in p else 'link'] = p['href']
+            else:
+                convert = converters.get(key, lambda value: value)
+                for p in properties:
+                    # Sentinel-3 has one property with 'str' instead of 'content'
+                    product[p['name']] = convert(p['content'] if 'content' in p else p['str'])
+    return products
+
+
+
+###
+### QUERYING ###
+###
+
+# same as SentinelAPI.query(area, date=date, **keywords), with the pages fetched in parallel
+def query_opensearch(session, api_url, area, date=None, connections=8, **keywords):
+    query = format_query(area, date, **keywords)
+    entries, total = search_all(session, api_url, query, connections)
+    if len(entries) < total:
+        print('WARNING: ' + str(total - len(entries)) + ' products went missing while paging (results changed on the server)')
+    return parse_entries(entries)
@@ -0,0 +1,122 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# On-disk cache of raw metadata query responses (e.g. the results of one SentinelAPI query)
+#   - content-addressed: each response is stored under the hash of everything that defines the query
+#     (API url, region of interest (WKT), date window, platform/instrument & any other filters)
+#   - re-running a script with the same query (e.g. to change the parameters of interest or the output format)
+#     re-uses the cached responses instead of querying the API again
+#   - eviction:
+#       - time to live: responses older than ttl_days are queried again (the archive keeps changing)
+#       - size: if the cache is larger than max_mb, the least recently used responses are removed
+#   - offline replay: with offline=True nothing is queried; every response has to come from the cache (expired ones included)
+
+### CACHE FILES ###
+# <cache_dir>/<sha256 of the query>.pkl
+#   - modification time: when the response was cached (used for the time to live)
+#   - access time: when the response was last used (used for the size eviction)
+
+### LIMITATIONS ###
+# - responses are pickled, so the cache should only be shared between trusted users/machines
+
+###########################################################################
+
+import hashlib
+import json
+import os
+import pickle
+import time
+
+
+
+###
+### CACHE SETTINGS ###
+###
+
+cache_ext = '.pkl'
+
+# default time to live (days) & maximum cache size (MB)
+default_ttl_days = 7
+default_max_mb = 500
+
+
+
+###
+### CACHE KEYS ###
+###
+
+# hash of a query; the parts are anything json can write (datetimes/dates are written as strings)
+def query_key(**query):
+    text = json.dumps(query, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cached_file(cache_dir, key):
+    return os.path.join(cache_dir, key + cache_ext)
+
+
+
+###
+### READING/WRITING RESPONSES ###
+###
+
+# cached response for a query key; None if it isn't cached (or is older than ttl_days, unless offline)
+def read_response(cache_dir, key, ttl_days=default_ttl_days, offline=False):
+    path = cached_file(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+
+    cached_time = os.path.getmtime(path)
+    if not offline and ttl_days is not None and time.time() - cached_time > ttl_days * 86400:
+        return None
+
+    with open(path, 'rb') as f:
+        response = pickle.load(f)
+
+    # mark as recently used (the modification time stays the time it was cached)
+    os.utime(path, (time.time(), cached_time))
+    return response
+
+
+# cache a response; written to a temporary file first, so a crash never leaves a partial response behind
+def write_response(cache_dir, key, response):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cached_file(cache_dir, key)
+    tmp = path + '.tmp' + str(os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(response, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+
+###
+### EVICTION ###
+###
+
+# remove expired responses, then the least recently used ones until the cache is at most max_mb
+def evict(cache_dir, ttl_days=default_ttl_days, max_mb=default_max_mb):
+    if not os.path.isdir(cache_dir):
+        return
+
+    now = time.time()
+    files = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_file() or not entry.name.endswith(cache_ext):
+            continue
+        stat = entry.stat()
+        if ttl_days is not None and now - stat.st_mtime > ttl_days * 86400:
+            os.remove(entry.path)
+            continue
+        files.append((stat.st_atime, stat.st_size, entry.path))
+
+    if max_mb is None:
+        return
+
+    size = sum(file_size for _, file_size, _ in files)
+    for _, file_size, path in sorted(files):
+        if size <= max_mb * 1024 * 1024:
+            break
+        os.remove(path)
+        size -= file_size
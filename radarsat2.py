@@ -28,13 +28,15 @@
 
 ###########################################################################
 
-import fiona
 import pandas as pd
 import geopandas as gpd
 
 from eodms_rapi import EODMSRAPI
-from datetime import datetime
-from shapely import wkt
+
+from eodms_catalog import open_catalog, catalog_ids, add_records, read_records
+from eodms_harvest import harvest_new, remove_checkpoints
+from eodms_schema import convert_records
+from metadata_io import write_metadata
 
 
 
@@ -63,7 +65,23 @@ outfile = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/data_github_te
 parameters_pass = { 'recordId', 'collectionId', 'incidenceAngle', 'beam', 'segmentQuality', 'absoluteOrbit', 'polarization', 'transmitPolarization', 'spatialResolution', 'startDate', 'position', 'sensorMode', 'featureId', 'lookOrientation', 'orbitDirection', 'title', 'thisRecordUrl', 'geometry', 'wktGeometry' }
 
 # specify product of interest
-product = 'Radarsat2RawProducts' ### NEED TO UPDATE QUERY LINE 85
+product = 'Radarsat2RawProducts'
+
+# checkpoints: the results of each search window are saved here as they arrive, so an interrupted run resumes
+#   where it stopped (removed once the records are in the catalog); None for no checkpoints
+checkpoint_dir = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/eodms_checkpoints/'
+
+# two-phase search: records are searched with brief results first (incl. result_fields); the full metadata is only
+#   fetched for records that aren't in the catalog yet & aren't excluded (field > values to drop)
+result_fields = ['Segment Quality']
+exclude = {'segmentQuality': ['Problem']}   # dropped in the summary anyways
+
+# local catalog of all the metadata fetched so far (see eodms_catalog.py); only records that aren't in it are fetched
+#   & the output is made from it
+catalog_file = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/data/eodms_catalog.sqlite'
+
+# offline: make the output from the catalog only, without searching EODMS
+offline = False
 
 
 
@@ -76,27 +94,37 @@ product = 'Radarsat2RawProducts' ### NEED TO UPDATE QUERY LINE 85
 ### DOWNLOAD THE METADATA FROM EODMSRAPI ###
 ###
 
-# login to EODMSRAPI
-rapi = EODMSRAPI(username, password)
-print('\n\nLogged in successfully')
+catalog = open_catalog(catalog_file)
 
-# set up query parameters
-dates = [{"start": date_start, "end": date_end}]
+if not offline:
+    # login to EODMSRAPI
+    rapi = EODMSRAPI(username, password)
+    print('\n\nLogged in successfully')
 
-# submit the search to the EODMSRAPI, specifying the Collection (?)
-print('Querying data... \n')
-rapi.search("Radarsat2RawProducts", features=roi, dates=dates)
+    # submit the search to the EODMSRAPI, specifying the Collection, & add the new records to the catalog
+    #   the time period is searched in date windows that are split/grown automatically (see eodms_harvest.py)
+    #   the full metadata is only retrieved for records that aren't in the catalog yet & aren't excluded
+    print('Querying data... \n')
+    new_records = harvest_new(rapi, product, roi, date_start, date_end, known_ids=catalog_ids(catalog, product), exclude=exclude, result_fields=result_fields, checkpoint_dir=checkpoint_dir)
+    add_records(catalog, product, new_records)
 
-# retrieve the results from the search
-res = rapi.get_results('full')
+    # the records are in the catalog, so the checkpoints aren't needed anymore
+    if checkpoint_dir is not None:
+        remove_checkpoints(checkpoint_dir, product, roi, date_start, date_end, form='brief', result_fields=result_fields)
+
+# metadata for the time period & region of interest, from the catalog
+#   only the parameters of interest are kept; the records are stored as columns (see record_columns.py)
+res = read_records(catalog, product, date_start, date_end, roi, fields=parameters_pass, exclude=exclude)
+catalog.close()
 
 ### SOME OPTIONAL QUALITY ANALYSIS 
-# check to see is all the keys are the same
-product_keys = [res[footprint].keys() for footprint in range(len(res))]
-product_keys_check = set([res[0].keys() == res[footprint].keys() for footprint in range(len(res))])
+# check to see is all the keys are the same (the parameters of interest are in every record)
+inconsistent_fields = res.inconsistent_fields()
 
-if False in product_keys_check:
-    print('\nERROR: Product keys are inconsistent between products \n\n')
+if len(res) == 0:
+    print('\nNo records \n\n')
+elif len(inconsistent_fields) > 0:
+    print('\nERROR: Product keys are inconsistent between products (records missing each key): ' + str(inconsistent_fields) + '\n\n')
 else:
     print('\nGOOD TO GO: Product keys are consistent between products :) \n\n')
 
@@ -106,33 +134,19 @@ else:
 ### FILTER/SUBSET THE METADATA TO INFORMATION RELEVANT TO ALGAL BLOOMS TO TRIM AND SAVE SPACE ###
 ###
 
-# filter the data to parameters of interest
-products = [{k1: v1 for k1, v1 in res[j].items() if k1 in parameters_pass} for j in range(len(res))]
-
-# numerical data are stored as strings; convert to numerical 
-# add a date column comptible with shapefile 
-radarsat_2_datetime_fmt = '%Y-%m-%dT%H:%M:%S'
-for i in range(len(products)): # CAN I GET RID OF THIS FOR LOOP?
-    products[i]['startDate'] = products[i]['startDate'][:-6] # need to strip the last few digits ' +0000' - it's all the same anyways 
-    products[i]['starttime'] = datetime.strptime(products[i]['startDate'], radarsat_2_datetime_fmt)
-    products[i]['starttime'] = products[i]['starttime'].strftime('%Y-%m-%d %H:%M:%S.%f')
-    
-    products[i]['recordId'] = int(products[i]['recordId'])
-    products[i]['incidenceAngle'] = int(products[i]['incidenceAngle'])
-    products[i]['absoluteOrbit'] = float(products[i]['absoluteOrbit'])
-    products[i]['spatialResolution'] = int(products[i]['spatialResolution'])
-
+# the records read from the catalog only hold the parameters of interest
 
 # save as shapefile 
-#   converting through dict > pandas dataframe > geopandas geodataframe # IS THIS STILL TRUE? 
+#   converting through record columns > pandas dataframe > geopandas geodataframe
+#   numerical data are stored as strings; convert to numerical & add a date column (see eodms_schema.py)
 #   create a geometry column to convert to geodataframe 
-df = pd.DataFrame(products)
+df = convert_records(res.to_frame(), product) if len(res) > 0 else pd.DataFrame({'wktGeometry': []})
 df['geometry'] = gpd.GeoSeries.from_wkt(df['wktGeometry'])
 gdf = gpd.GeoDataFrame(df, geometry='geometry', crs='EPSG:4326')
 
 
-# write data to shapefile
-gdf.to_file(outfile)
+# write data to file; the storage format follows the extension of outfile (.shp, .gpkg or .parquet)
+write_metadata(gdf, outfile)
 
 
 
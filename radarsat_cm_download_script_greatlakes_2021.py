@@ -45,57 +45,27 @@
 username = 'DJBEAULNE'
 password = 'MadW0rld!'
 
-date_start_1 = '20220101_000000'  # yyyymmdd_hhmmss   ### JAN
-date_end_1 = '20220131_235959'    # yyyymmdd_hhmmss
-dates_1 = [{"start": date_start_1, "end": date_end_1}]
+date_start = '20210101_000000'  # yyyymmdd_hhmmss
+date_end = '20211231_235959'    # yyyymmdd_hhmmss
 
-date_start_2 = '20210201_000000'  # yyyymmdd_hhmmss   ### FEB
-date_end_2 = '20210228_235959'    # yyyymmdd_hhmmss
-dates_2 = [{"start": date_start_2, "end": date_end_2}]
 
-date_start_3 = '20210301_000000'  # yyyymmdd_hhmmss   ### MAR
-date_end_3 = '20210331_235959'    # yyyymmdd_hhmmss
-dates_3 = [{"start": date_start_3, "end": date_end_3}]
 
-date_start_4 = '20210401_000000'  # yyyymmdd_hhmmss   ### APR
-date_end_4 = '20210430_235959'    # yyyymmdd_hhmmss
-dates_4 = [{"start": date_start_4, "end": date_end_4}]
-
-date_start_5 = '20210501_000000'  # yyyymmdd_hhmmss   ### MAY
-date_end_5 = '20210531_235959'    # yyyymmdd_hhmmss
-dates_5 = [{"start": date_start_5, "end": date_end_5}]
-
-date_start_6 = '20210601_000000'  # yyyymmdd_hhmmss   ### JUN
-date_end_6 = '20210630_235959'    # yyyymmdd_hhmmss
-dates_6 = [{"start": date_start_6, "end": date_end_6}]
-
-date_start_7 = '20210701_000000'  # yyyymmdd_hhmmss   ### JUL
-date_end_7 = '20210731_235959'    # yyyymmdd_hhmmss
-dates_7 = [{"start": date_start_7, "end": date_end_7}]
-
-date_start_8 = '20210801_000000'  # yyyymmdd_hhmmss   ### AUG
-date_end_8 = '20210831_235959'    # yyyymmdd_hhmmss
-dates_8 = [{"start": date_start_8, "end": date_end_8}]
-
-date_start_9 = '20210901_000000'  # yyyymmdd_hhmmss   ### SEP
-date_end_9 = '20210930_235959'    # yyyymmdd_hhmmss
-dates_9 = [{"start": date_start_9, "end": date_end_9}]
-
-date_start_10 = '20211001_000000'  # yyyymmdd_hhmmss   ### OCT
-date_end_10 = '20211031_235959'    # yyyymmdd_hhmmss
-dates_10 = [{"start": date_start_10, "end": date_end_10}]
-
-date_start_11 = '20211101_000000'  # yyyymmdd_hhmmss   ### NOV
-date_end_11 = '20211130_235959'    # yyyymmdd_hhmmss
-dates_11 = [{"start": date_start_11, "end": date_end_11}]
+roi = [('intersects', "Polygon ((-95.155703 41.68132, -74.343472 41.68132, -74.343472 56.861705, -95.155703 56.861705, -95.155703 41.68132))")]
 
-date_start_12 = '20211201_000000'  # yyyymmdd_hhmmss   ### DEC
-date_end_12 = '20211231_235959'    # yyyymmdd_hhmmss
-dates_12 = [{"start": date_start_12, "end": date_end_12}]
+# checkpoints: the results of each search window are saved here as they arrive, so an interrupted run resumes
+#   where it stopped (removed once the records are in the catalog); None for no checkpoints
+checkpoint_dir = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/radarsat_cm/data/eodms_checkpoints/'
 
+# two-phase search: records are searched with brief results first; the full metadata is only fetched for records that
+#   aren't in the catalog yet & aren't excluded (field > values to drop)
+exclude = {}
 
+# local catalog of all the metadata fetched so far (see eodms_catalog.py); only records that aren't in it are fetched
+#   & the output is made from it
+catalog_file = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/radarsat_cm/data/eodms_catalog.sqlite'
 
-roi = [('intersects', "Polygon ((-95.155703 41.68132, -74.343472 41.68132, -74.343472 56.861705, -95.155703 56.861705, -95.155703 41.68132))")]
+# offline: make the output from the catalog only, without searching EODMS
+offline = False
 
 # filters = {'Beam Mnemonic': ('=', ['16M11', '16M13']), 'Incidence Angle': ('>=', '35')}
 
@@ -105,7 +75,7 @@ parameters_pass = { 'recordId', 'collectionId', 'beamModeVersion', 'beamMnemonic
 
 
 # output information
-outfile = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/radarsat_cm/data/RADARSAT-cm_' + date_start_1[0:8] + '_' + date_end_2[0:8] + '_ontario.shp'
+outfile = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/radarsat_cm/data/RADARSAT-cm_' + date_start[0:8] + '_' + date_end[0:8] + '_ontario.shp'
 
 
 
@@ -113,92 +83,43 @@ outfile = '/Users/danielle/Work/AlgalBlooms/AlgalBloomWebApp/radarsat_cm/data/RA
 ### SCRIPT START ###
 ###
 
-import fiona
 import pandas as pd
 import geopandas as gpd
 from eodms_rapi import EODMSRAPI
-from datetime import datetime
-from shapely import wkt
-
-
-# set up & perform search
-rapi = EODMSRAPI(username, password)
-print('\n\nLogged in successfully')
-
-#dates = [{"start": date_start, "end": date_end}]
 
-print('Querying data... \n')
-# can search for relevant collections using: >>> print(rapi.get_collections(as_list=True))
+from eodms_catalog import open_catalog, catalog_ids, add_records, read_records
+from eodms_harvest import harvest_new, remove_checkpoints
+from eodms_schema import convert_records
+from metadata_io import write_metadata
 
 
-### NEED TO BREAK IT UP .... not sure why but throws an error if I try to do Jan - Sept 2021 all at once... 
-print('\n\nJanuary... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_1)   # Submit the search to the EODMSRAPI, specifying the Collection
-res_1 = rapi.get_results('full')   # Get the results from the search
+catalog = open_catalog(catalog_file)
 
-print('\n\nFebruary... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_2)   # Submit the search to the EODMSRAPI, specifying the Collection
-res_2 = rapi.get_results('full')   # Get the results from the search
+if not offline:
+    # set up & perform search
+    rapi = EODMSRAPI(username, password)
+    print('\n\nLogged in successfully')
 
-print('\n\nMarch... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_3)   # MAR
-res_3 = rapi.get_results('full')  
+    print('Querying data... \n')
+    # can search for relevant collections using: >>> print(rapi.get_collections(as_list=True))
 
-print('\n\nApril... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_4)   # ARP
-res_4 = rapi.get_results('full')  
+    # the search throws an error if the whole year is searched at once, so the time period is searched in date windows
+    #   that are split/grown automatically (see eodms_harvest.py)
+    # the full metadata is only retrieved for records that aren't in the catalog yet & aren't excluded
+    new_records = harvest_new(rapi, "RCMImageProducts", roi, date_start, date_end, known_ids=catalog_ids(catalog, "RCMImageProducts"), exclude=exclude, checkpoint_dir=checkpoint_dir)
+    add_records(catalog, "RCMImageProducts", new_records)
 
-print('\n\nMay... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_5)   # MAY
-res_5 = rapi.get_results('full')  
+    # the records are in the catalog, so the checkpoints aren't needed anymore
+    if checkpoint_dir is not None:
+        remove_checkpoints(checkpoint_dir, "RCMImageProducts", roi, date_start, date_end, form='brief')
 
-print('\n\nJune... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_6)   # JUN
-res_6 = rapi.get_results('full')  
+# metadata for the time period & region of interest, from the catalog
+#   only the parameters of interest are kept; the records are stored as columns (see record_columns.py)
+res = read_records(catalog, "RCMImageProducts", date_start, date_end, roi, fields=parameters_pass, exclude=exclude)
+catalog.close()
 
-print('\n\nJuly... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_7)   # JUL
-res_7 = rapi.get_results('full')  
-
-print('\n\nAugust... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_8)   # AUG
-res_8 = rapi.get_results('full')  
-
-print('\n\nSeptember... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_9)   # SEP
-res_9 = rapi.get_results('full')  
-
-print('\n\nOctober... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_10)   # OCT
-res_10 = rapi.get_results('full')  
-
-print('\n\nNovember... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_11)   # NOV
-res_11 = rapi.get_results('full')  
-
-print('\n\nDecember... ')
-rapi.search("RCMImageProducts", features=roi, dates=dates_12)   # DEC
-res_12 = rapi.get_results('full')  
-
-
-
-# test that these lists are actually populated... 
-print( '\n LENGTH RADARSAT-CM Jan:  ', str(len(res_1)))
-print( '\n LENGTH RADARSAT-CM Feb:  ', str(len(res_2)))
-print( '\n LENGTH RADARSAT-CM Mar:  ', str(len(res_3)))
-print( '\n LENGTH RADARSAT-CM Apr:  ', str(len(res_4)))
-print( '\n LENGTH RADARSAT-CM May:  ', str(len(res_5)))
-print( '\n LENGTH RADARSAT-CM Jun:  ', str(len(res_6)))
-print( '\n LENGTH RADARSAT-CM Jul:  ', str(len(res_7)))
-print( '\n LENGTH RADARSAT-CM Aug:  ', str(len(res_8)))
-print( '\n LENGTH RADARSAT-CM Sep:  ', str(len(res_9)))
-print( '\n LENGTH RADARSAT-CM Oct:  ', str(len(res_10)))
-print( '\n LENGTH RADARSAT-CM Nov:  ', str(len(res_11)))
-print( '\n LENGTH RADARSAT-CM Dec:  ', str(len(res_12)))
-
-
-# re-merge... res_1/2 are both lists, so it's easy 
-res = res_1 + res_2 + res_3 + res_4 + res_5 + res_6 + res_7 + res_8 + res_9 + res_10 + res_11 + res_12
+# test that the list is actually populated... 
+print( '\n LENGTH RADARSAT-CM:  ', str(len(res)))
 
 
 
@@ -206,56 +127,26 @@ res = res_1 + res_2 + res_3 + res_4 + res_5 + res_6 + res_7 + res_8 + res_9 + re
 #rapi.print_results()
 
 
-# check to see is all the keys are the same
-product_keys = [res[footprint].keys() for footprint in range(len(res))]
-product_keys_check = set([res[0].keys() == res[footprint].keys() for footprint in range(len(res))])  # {TRUE}
+# check to see is all the keys are the same (the parameters of interest are in every record)
+inconsistent_fields = res.inconsistent_fields()
 
-if False in product_keys_check:
-    print('\nERROR: Product keys are inconsistent between products \n\n')
+if len(inconsistent_fields) > 0:
+    print('\nERROR: Product keys are inconsistent between products (records missing each key): ' + str(inconsistent_fields) + '\n\n')
 else:
     print('\nGOOD TO GO: Product keys are consistent between products :) \n\n')
 
 
 
 
-# filter the data to only parameters of interest
-products = [{k1: v1 for k1, v1 in res[j].items() if k1 in parameters_pass} for j in range(len(res))]
-
-
 # numerical data is stored as strings, so need to convert them to numbers 
-# also add a compatible date column
-radarsat_cm_datetime_fmt = '%Y-%m-%dT%H:%M:%S'
-for i in range(len(products)):
-    products[i]['acquisitionStartDate'] = products[i]['acquisitionStartDate'][:-6] # need to strip the last few digits ' +0000' - it's all the same anyways 
-    products[i]['starttime'] = datetime.strptime(products[i]['acquisitionStartDate'], radarsat_cm_datetime_fmt)
-    products[i]['starttime'] = products[i]['starttime'].strftime('%Y-%m-%d %H:%M:%S.%f')
-    
-    products[i]['acquisitionEndDate'] = products[i]['acquisitionEndDate'][:-6] # need to strip the last few digits ' +0000' - it's all the same anyways 
-    products[i]['endtime'] = datetime.strptime(products[i]['acquisitionEndDate'], radarsat_cm_datetime_fmt)
-    products[i]['endtime'] = products[i]['endtime'].strftime('%Y-%m-%d %H:%M:%S.%f')
-    
-    products[i]['recordId'] = int(products[i]['recordId'])
-    products[i]['incidenceAngle'] = int(products[i]['incidenceAngle'])
-    if products[i]['numberOfAzimuthLooks'] != '': products[i]['numberOfAzimuthLooks'] = int(products[i]['numberOfAzimuthLooks'])
-    if products[i]['numberOfRangeLooks'] != '': products[i]['numberOfRangeLooks'] = int(products[i]['numberOfRangeLooks'])
-    products[i]['spatialResolution'] = int(products[i]['spatialResolution'])
-    if products[i]['sampledPixelSpacing'] != '': products[i]['sampledPixelSpacing'] = float(products[i]['sampledPixelSpacing'])
-    if products[i]['geodeticTerrainHeight'] != '': products[i]['geodeticTerrainHeight'] = float(products[i]['geodeticTerrainHeight'])
-    products[i]['relativeOrbit'] = int(products[i]['relativeOrbit'])
-    products[i]['absoluteOrbit'] = float(products[i]['absoluteOrbit'])
-    if products[i]['beamModeDefinitionId'] != '': products[i]['beamModeDefinitionId'] = float(products[i]['beamModeDefinitionId'])
-    
-
-
-
-# lets try using pandas dataframe instead... could save a lot of time... 
-df = pd.DataFrame(products)
+# also add start/end date columns (see eodms_schema.py)
+df = convert_records(res.to_frame(), "RCMImageProducts") if len(res) > 0 else pd.DataFrame({'wktGeometry': []})
 df['geometry'] = gpd.GeoSeries.from_wkt(df['wktGeometry'])
 gdf = gpd.GeoDataFrame(df, geometry='geometry', crs='EPSG:4326')
 
 
-# write data to shapefile
-gdf.to_file(outfile)
+# write data to file; the storage format follows the extension of outfile (.shp, .gpkg or .parquet)
+write_metadata(gdf, outfile)
 
 
 
@@ -0,0 +1,101 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Compact storage of metadata records (Sentinel products, EODMS records) as columns instead of one dict per record
+#   - records are added one at a time (e.g. straight from a query response) & only the fields of interest are kept,
+#     so large result sets never sit in memory as hundreds of thousands of dicts with the same keys repeated
+#   - each field is one list of values; fields missing from a record are filled with None (& counted, to check that the
+#     records have consistent keys)
+#   - short strings (e.g. platform names, polarisations, beam modes) are interned, so repeated values are stored once
+#   - converts to a pandas DataFrame column by column (no per-record dicts)
+
+###########################################################################
+
+import sys
+
+import pandas as pd
+
+
+
+###
+### SETTINGS ###
+###
+
+# strings up to this length are interned (longer ones, e.g. footprints/links, are rarely repeated)
+intern_max_len = 64
+
+
+
+###
+### RECORD COLUMNS ###
+###
+
+class RecordColumns:
+    __slots__ = ('fields', 'columns', 'missing', 'n')
+
+    # fields: fields to keep (None for all); columns are in order of first appearance
+    def __init__(self, fields=None):
+        self.fields = set(fields) if fields is not None else None
+        self.columns = {}
+        self.missing = {}
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    # add one record (dict)
+    def append(self, record):
+        for key, value in record.items():
+            if self.fields is not None and key not in self.fields:
+                continue
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.n
+                self.missing[key] = self.n
+            if isinstance(value, str) and len(value) <= intern_max_len:
+                value = sys.intern(value)
+            column.append(value)
+
+        self.n += 1
+        for key, column in self.columns.items():
+            if len(column) < self.n:
+                column.append(None)
+                self.missing[key] += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    # fields missing from some of the records (field > number of records missing it)
+    def inconsistent_fields(self):
+        return {key: count for key, count in self.missing.items() if count > 0}
+
+    # records where keep (list/array of booleans) is True
+    def take(self, keep):
+        taken = RecordColumns(self.fields)
+        taken.columns = {key: [value for value, kept in zip(column, keep) if kept] for key, column in self.columns.items()}
+        taken.missing = {key: sum(1 for value, kept in zip(column, keep) if kept and value is None) for key, column in self.columns.items()}
+        taken.n = int(sum(1 for kept in keep if kept))
+        return taken
+
+    def to_frame(self):
+        return pd.DataFrame({key: pd.Series(column, dtype=object if len(column) == 0 else None) for key, column in self.columns.items()}, index=pd.RangeIndex(self.n))
+
+
+# put several RecordColumns one after the other (columns in order of first appearance; fields missing from a part are None)
+def concat_columns(parts):
+    merged = RecordColumns()
+    for part in parts:
+        for key in part.columns:
+            if key not in merged.columns:
+                merged.columns[key] = []
+                merged.missing[key] = 0
+    for part in parts:
+        for key, column in merged.columns.items():
+            values = part.columns.get(key)
+            column += values if values is not None else [None] * part.n
+            merged.missing[key] += part.missing.get(key, part.n)
+        merged.n += part.n
+    return merged
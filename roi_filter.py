@@ -0,0 +1,72 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Filtering footprints to a region of interest (ROI)
+#   - answers "which footprints intersect the ROI?" without computing any intersection polygons
+#       - footprints go into an STRtree (spatial index); the ROI part(s) are queried against it in one bulk call
+#       - multi-polygon ROIs (e.g. the Great Lakes extent) are split into their parts so each part only tests the nearby footprints
+#   - works for any mission's GeoDataFrame/GeoSeries of footprints
+
+###########################################################################
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+
+
+###
+### REGION OF INTEREST ###
+###
+
+# read a region of interest file (e.g. shapefile, geojson)
+def read_roi(roi, crs='EPSG:4326'):
+    roi_gpd = gpd.read_file(roi)
+    if roi_gpd.crs is not None and crs is not None:
+        roi_gpd = roi_gpd.to_crs(crs)
+    return roi_gpd
+
+
+# all the polygons of a region of interest as one flat array of (single-part) geometries
+#   - accepts a GeoDataFrame/GeoSeries, a single shapely geometry, or an array of geometries
+def roi_parts(roi_gpd, crs=None):
+    if isinstance(roi_gpd, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        if crs is not None and roi_gpd.crs is not None:
+            roi_gpd = roi_gpd.to_crs(crs)
+        geometries = np.asarray(roi_gpd.geometry.values)
+    else:
+        geometries = np.atleast_1d(np.asarray(roi_gpd, dtype=object))
+
+    parts = shapely.get_parts(geometries[~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)])
+    shapely.prepare(parts)
+    return parts
+
+
+
+###
+### FILTERING ###
+###
+
+# boolean array; True for every footprint that intersects the region of interest
+#   - one STRtree over the footprints + one bulk 'intersects' query per ROI part (no overlay, no intersection polygons)
+def intersects_roi(footprints, roi_gpd):
+    crs = footprints.crs if isinstance(footprints, (gpd.GeoDataFrame, gpd.GeoSeries)) else None
+    if isinstance(footprints, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        footprints = footprints.geometry.values
+
+    geometries = np.asarray(footprints, dtype=object)
+    mask = np.zeros(len(geometries), dtype=bool)
+    if len(geometries) == 0:
+        return mask
+
+    tree = shapely.STRtree(geometries)
+    _, footprint_index = tree.query(roi_parts(roi_gpd, crs=crs), predicate='intersects')
+    mask[footprint_index] = True
+    return mask
+
+
+# subset of a GeoDataFrame whose footprints intersect the region of interest
+def filter_to_roi(data_gpd, roi_gpd):
+    return data_gpd.loc[intersects_roi(data_gpd.geometry, roi_gpd)]
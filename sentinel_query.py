@@ -0,0 +1,222 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Shared engine for downloading Sentinel metadata from the Copernicus API Hub (sentinelsat)
+#   - used by the Sentinel-1/2/3 scripts, which only hold their settings (platform, groups, parameters of interest, ...)
+#   - querying:
+#       - the time period of interest is split into date windows
+#       - the windows are queried at the same time with a bounded thread pool (one API session per thread)
+#       - optionally, the result pages of each window are fetched in parallel too (see opensearch.py)
+#       - the results are merged back together in date order & de-duplicated by uuid
+#       - optionally, the raw response of each window is cached on disk (see query_cache.py), so re-runs only query
+#         the windows that aren't cached yet; offline re-runs don't query anything
+#   - incremental updates: only the products ingested since the last run are queried (see incremental.py)
+#   - converting:
+#       - one pass over the products: each is routed to its group & its parameters of interest go straight into
+#         compact record columns (see record_columns.py)
+#       - converted to a GeoDataFrame with the footprint as geometry; datetime columns stay timestamps (they're only
+#         formatted as strings when written to a shapefile, see metadata_io.py)
+
+###########################################################################
+
+import threading
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from sentinelsat import SentinelAPI, read_geojson, geojson_to_wkt
+
+from metadata_io import datetime_format, as_datetime
+from opensearch import opensearch_session, query_opensearch
+from query_cache import default_ttl_days, default_max_mb, query_key, read_response, write_response, evict
+from record_columns import RecordColumns, concat_columns
+
+
+
+###
+### SETTINGS ###
+###
+
+# format of the start/end dates in the Sentinel scripts
+query_date_fmt = '%Y%m%d'
+
+
+###
+### QUERYING ###
+###
+
+# footprint (WKT) of a region of interest file (geojson)
+def roi_footprint(roi):
+    return geojson_to_wkt(read_geojson(roi))
+
+
+# split the time period of interest into windows of (at most) window_days days
+#   - dates are in the format YYYYMMDD; returns (start, end) datetimes
+#   - window boundaries are shared by neighbouring windows; duplicates are removed when the results are merged
+def date_windows(start_date, end_date, window_days=30):
+    start = datetime.strptime(start_date, query_date_fmt)
+    end = datetime.strptime(end_date, query_date_fmt)
+
+    windows = []
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + timedelta(days=window_days), end)
+        windows.append((window_start, window_end))
+        window_start = window_end
+
+    if len(windows) == 0:
+        windows.append((start, end))
+    return windows
+
+
+# merge the query results of several windows, keeping the first copy of each product (by uuid)
+def merge_products(results):
+    products = OrderedDict()
+    for result in results:
+        for product in result.values():
+            products.setdefault(product['uuid'], product)
+    return products
+
+
+# query the metadata for a time period & footprint, split into date windows that are queried at the same time
+#   - filters: other query parameters (e.g. platformname='Sentinel-2', instrumentshortname='OLCI'); None values are ignored
+#   - workers: maximum number of windows queried at the same time
+#   - backend: 'sentinelsat' (SentinelAPI.query; result pages fetched one at a time) or 'opensearch' (result pages
+#     fetched in parallel over a pool of keep-alive connections, see opensearch.py)
+#       - connections: maximum number of requests in flight with the 'opensearch' backend
+#   - cache_dir: folder for the query response cache (see query_cache.py); windows that are already cached aren't queried
+#       - cache_days: cached windows older than this are queried again; cache_mb: maximum size of the cache
+#       - offline: only use the cache (no login); fails if a window isn't cached
+#   - returns an OrderedDict of uuid > product (same as SentinelAPI.query)
+def query_sentinel(username, password, url, footprint, start_date, end_date, window_days=30, workers=4, backend='sentinelsat', connections=8, cache_dir=None, cache_days=default_ttl_days, cache_mb=default_max_mb, offline=False, **filters):
+    windows = date_windows(start_date, end_date, window_days)
+    filters = {name: value for name, value in filters.items() if value is not None}
+    if offline and cache_dir is None:
+        raise ValueError('offline queries need a cache_dir')
+
+    if backend not in ('sentinelsat', 'opensearch'):
+        raise ValueError("backend must be 'sentinelsat' or 'opensearch'")
+
+    # sentinelsat: sessions aren't shared between threads; each thread logs in once (only if it has a window to query)
+    # opensearch: one session (connection pool) shared by all threads
+    local = threading.local()
+    session = opensearch_session(username, password, connections) if backend == 'opensearch' and not offline else None
+
+    def query_window(window):
+        key = query_key(url=url, footprint=footprint, date=window, **filters)
+        if cache_dir is not None:
+            result = read_response(cache_dir, key, ttl_days=cache_days, offline=offline)
+            if result is not None:
+                print('... ' + window[0].strftime('%Y-%m-%d') + ' - ' + window[1].strftime('%Y-%m-%d') + ': ' + str(len(result)) + ' products (cached)')
+                return result
+            if offline:
+                raise ValueError('date window not in the query cache (offline): ' + str(window[0]) + ' - ' + str(window[1]))
+
+        if backend == 'opensearch':
+            result = query_opensearch(session, url, footprint, date=window, connections=connections, **filters)
+        else:
+            if not hasattr(local, 'api'):
+                local.api = SentinelAPI(username, password, url)
+            result = local.api.query(footprint, date=window, **filters)
+        print('... ' + window[0].strftime('%Y-%m-%d') + ' - ' + window[1].strftime('%Y-%m-%d') + ': ' + str(len(result)) + ' products')
+
+        if cache_dir is not None:
+            write_response(cache_dir, key, result)
+        return result
+
+    print('Querying ' + str(len(windows)) + ' date windows (' + str(workers) + ' at a time)...')
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(query_window, windows))
+    if session is not None:
+        session.close()
+
+    if cache_dir is not None and not offline:
+        evict(cache_dir, ttl_days=cache_days, max_mb=cache_mb)
+
+    products = merge_products(results)
+    print('... ' + str(len(products)) + ' unique products')
+    return products
+
+
+
+###
+### INCREMENTAL UPDATES ###
+###
+
+# query filter for the products ingested since the last run (None if there was no last run)
+#   - the window ends now (instead of 'NOW'), so it never matches a response cached by an earlier run
+#   - products ingested exactly at the watermark are queried again; they're dropped as unchanged (see drop_unchanged)
+def ingestion_filter(state):
+    if state is None or state.get('watermark') is None:
+        return None
+    watermark = datetime.strptime(state['watermark'], datetime_format)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (watermark, now)
+
+
+# drop the products that are already in the output & haven't changed since the last run (None if there was no last run)
+#   - known products (uuid in the state) ingested after the watermark were reprocessed/re-ingested; they're kept, so
+#     upsert replaces them in the output
+#   - known products ingested at the watermark were processed by the last run
+def drop_unchanged(products, state):
+    if state is None or state.get('watermark') is None:
+        return products
+    known_uuids = set(state['keys'].get('uuid', []))
+    watermark = datetime.strptime(state['watermark'], datetime_format)
+    return OrderedDict((uuid, product) for uuid, product in products.items() if product['uuid'] not in known_uuids or product['ingestiondate'] > watermark)
+
+
+# latest ingestion date in an output; None if it's empty
+def ingestion_watermark(products_gdf, column='ingestiondate'):
+    if column not in products_gdf.columns or len(products_gdf) == 0:
+        return None
+    return as_datetime(products_gdf[column]).max().strftime(datetime_format)
+
+
+
+###
+### CONVERTING ###
+###
+
+# route every product to its group(s) & write the parameters of interest straight into per-group record columns
+#   - one pass over the query results; no per-product dict copies are made (see record_columns.py)
+#   - a product goes into every group whose rule it meets (same as filtering the products once per group)
+#   - returns one RecordColumns per group; keys missing from a product are filled with None
+def project_products(products, groups):
+    buffers = [RecordColumns(parameters_pass) for _, parameters_pass in groups]
+    for product in products.values():
+        for (rule, _), columns in zip(groups, buffers):
+            if rule(product):
+                columns.append(product)
+    return buffers
+
+
+# reduce the products to the parameters of interest & convert to a GeoDataFrame
+#   - groups: list of (rule, parameters_pass); rule(product) is True for the products of that group
+#     (products in a group have the same keys); products that fit no group are dropped
+#   - rows are in group order (all products of the first group, then the second, ...)
+#   - datetimes (e.g. 'beginposition', 'ingestiondate') stay timestamps
+#   - drop_columns: dropped after conversion (e.g. 'gmlfootprint')
+def products_to_gdf(products, groups, drop_columns=()):
+    # re-merge the groups column by column (columns in order of first appearance); each column gets one typed array
+    data = concat_columns(project_products(products, groups)).to_frame()
+
+    # footprints are parsed in one batched call
+    footprint = np.asarray(data.pop('footprint') if 'footprint' in data else [], dtype=object)
+    geometry = shapely.from_wkt(footprint)
+
+    products_subset_gdf = gpd.GeoDataFrame(data, geometry=geometry, crs='EPSG:4326')
+
+    # drop any unnecessary columns
+    #   (columns may be missing if there are no products, e.g. no new products in an incremental update)
+    products_subset_gdf = products_subset_gdf.drop(list(drop_columns), axis=1, errors='ignore')
+
+    return products_subset_gdf
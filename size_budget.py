@@ -0,0 +1,216 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Fitting outputs into a file size budget (ArcGIS Online accepts files up to 10 MB)
+#   - estimates the size of a shapefile (.shp + .shx + .dbf) from the data itself, without writing it:
+#       - .shp/.shx: fixed record headers + 16 bytes per vertex (+ 4 bytes per ring)
+#       - .dbf: fixed-width records; the field widths follow the rules of the GDAL shapefile driver
+#   - if the data doesn't fit, the footprints are simplified: for each group (e.g. mission) a simplification tolerance &
+#     coordinate precision grid is picked from simplification_levels
+#       - the vertex count at each level is measured on a sample of the footprints & scaled up, so no trial writes are needed
+#       - levels are raised one step at a time for the group that currently takes the most space, until the data fits
+#   - reports the geometric error introduced (Hausdorff distance between the original and written footprints) per group
+
+### LIMITATIONS ###
+# - the budget only applies to shapefiles (the ArcGIS Online uploads) & is only estimated for them; GeoPackage &
+#   GeoParquet outputs are written as they are, without fitting (write_within_budget)
+# - the budget is for the uncompressed files; a zipped upload is smaller, so the estimate errs on the safe side
+# - only the footprints are reduced; if the attributes alone are over budget, columns still need to be dropped
+# - tolerances are set in degrees (0.001 degrees is about 100 m); for projected data they're converted to metres
+#   (about 111 km per degree); the errors are reported in the units of the CRS
+
+###########################################################################
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from metadata_io import write_metadata, storage_format
+
+
+
+###
+### SETTINGS ###
+###
+
+# ArcGIS Online file size limit
+arcgis_budget_mb = 10
+
+# (simplification tolerance, coordinate precision grid) from least to most reduction; None = no change
+simplification_levels = [(None, None), (0.0001, 0.00001), (0.0005, 0.0001), (0.001, 0.0001), (0.005, 0.001), (0.01, 0.001), (0.05, 0.01), (0.1, 0.01)]
+
+# number of footprints per group used to estimate the vertex count at each level
+sample_size = 2000
+
+# metres per degree, to convert the tolerances for projected data
+metres_per_degree = 111320
+
+
+
+###
+### SIZE ESTIMATE ###
+###
+
+# .shp + .shx size of a geometry array
+def geometry_bytes(geometries):
+    geometries = np.asarray(geometries, dtype=object)
+    missing = shapely.is_missing(geometries) | shapely.is_empty(geometries)
+    n_coords = shapely.get_num_coordinates(geometries)
+    n_rings = shapely.get_num_interior_rings(shapely.get_parts(geometries[~missing])).sum() + shapely.get_num_geometries(geometries[~missing]).sum()
+
+    shp = 100 + 12 * int(np.sum(missing)) + 52 * int(np.sum(~missing)) + 4 * int(n_rings) + 16 * int(np.sum(n_coords))
+    shx = 100 + 8 * len(geometries)
+    return shp + shx
+
+
+# width of a .dbf field, following the GDAL shapefile driver defaults
+def field_width(values):
+    if pd.api.types.is_bool_dtype(values):
+        return 1
+    if pd.api.types.is_integer_dtype(values):
+        return 9 if values.dtype.itemsize <= 4 else 18
+    if pd.api.types.is_float_dtype(values):
+        return 24
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 80   # written as text (see metadata_io.py)
+
+    # text: 80 characters, widened to the longest value (up to 254)
+    lengths = values.dropna().astype(str).str.encode('utf-8').str.len()
+    longest = int(lengths.max()) if len(lengths) > 0 else 0
+    return min(max(80, longest), 254)
+
+
+# .dbf size of the attributes of a (Geo)DataFrame
+def attribute_bytes(data):
+    columns = [column for column in data.columns if column != getattr(data, '_geometry_column_name', None)]
+    record = 1 + sum(field_width(data[column]) for column in columns)
+    return 32 + 32 * len(columns) + 1 + record * len(data)
+
+
+# estimated shapefile size (bytes)
+def estimate_shapefile_size(data_gpd):
+    return attribute_bytes(data_gpd) + geometry_bytes(data_gpd.geometry.values)
+
+
+
+###
+### SIMPLIFICATION ###
+###
+
+# factor converting the tolerances (degrees) to the units of a CRS
+def crs_scale(crs):
+    if crs is None or crs.is_geographic:
+        return 1
+    return metres_per_degree * crs.axis_info[0].unit_conversion_factor ** -1
+
+
+# footprints simplified to one of the simplification_levels
+#   - scale: factor converting the tolerances to the units of the CRS (see crs_scale)
+#   - plain Douglas-Peucker is much faster than the topology-preserving version; the few footprints it makes invalid
+#     (or collapses to nothing) are simplified again with topology preserved
+def simplify_footprints(geometries, level, scale=1):
+    tolerance, grid = simplification_levels[level]
+    tolerance = tolerance * scale if tolerance is not None else None
+    grid = grid * scale if grid is not None else None
+    geometries = np.asarray(geometries, dtype=object)
+    if tolerance is not None:
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=False)
+        broken = ~shapely.is_missing(geometries) & (shapely.is_empty(simplified) | ~shapely.is_valid(simplified))
+        simplified[broken] = shapely.simplify(geometries[broken], tolerance, preserve_topology=True)
+        geometries = simplified
+    if grid is not None:
+        geometries = shapely.set_precision(geometries, grid, mode='pointwise')
+    return geometries
+
+
+# estimated .shp + .shx size of a group of footprints at every level, measured on a sample
+def level_bytes(geometries, rng, scale=1):
+    geometries = np.asarray(geometries, dtype=object)
+    n = len(geometries)
+    sample = geometries if n <= sample_size else geometries[rng.choice(n, sample_size, replace=False)]
+
+    sizes = []
+    for level in range(len(simplification_levels)):
+        sample_bytes = geometry_bytes(simplify_footprints(sample, level, scale)) - 200
+        sizes.append(sample_bytes * n / max(len(sample), 1))
+    return np.array(sizes)
+
+
+
+###
+### FITTING THE BUDGET ###
+###
+
+# simplify the footprints (per group) until the data fits in budget_mb
+#   - group_column: column to pick a level per group for (e.g. 'mission'); None for one level for everything
+#   - returns the data with the new footprints & a report per group: level, tolerance, grid, estimated size,
+#     and the mean/max geometric error introduced
+def fit_to_budget(data_gpd, budget_mb=arcgis_budget_mb, group_column=None, seed=0):
+    budget = budget_mb * 1024 * 1024
+    data_gpd = data_gpd.reset_index(drop=True)
+
+    groups = data_gpd[group_column].fillna('').astype(str).to_numpy() if group_column is not None else np.full(len(data_gpd), 'all')
+    names = list(pd.unique(groups))
+    geometries = np.asarray(data_gpd.geometry.values, dtype=object)
+
+    rng = np.random.default_rng(seed)
+    scale = crs_scale(data_gpd.crs)
+    sizes = {name: level_bytes(geometries[groups == name], rng, scale) for name in names}
+    levels = {name: 0 for name in names}
+    fixed = attribute_bytes(data_gpd) + 200
+
+    def total():
+        return fixed + sum(sizes[name][levels[name]] for name in names)
+
+    # next level that actually makes a group smaller (None if there isn't one)
+    def next_level(name):
+        smaller = [level for level in range(levels[name] + 1, len(simplification_levels)) if sizes[name][level] < sizes[name][levels[name]]]
+        return smaller[0] if len(smaller) > 0 else None
+
+    # raise the level of the group taking the most space (that can still be reduced) until it fits
+    while total() > budget:
+        reducible = [name for name in names if next_level(name) is not None]
+        if len(reducible) == 0:
+            print('WARNING: cannot fit the data into ' + str(budget_mb) + ' MB by simplifying the footprints (estimated ' + str(round(total() / 1024 / 1024, 2)) + ' MB); drop some columns')
+            break
+        largest = max(reducible, key=lambda name: sizes[name][levels[name]])
+        levels[largest] = next_level(largest)
+
+    # simplify & measure the error
+    report = []
+    new_geometries = geometries.copy()
+    for name in names:
+        in_group = groups == name
+        level = levels[name]
+        errors = np.zeros(int(np.sum(in_group)))
+        if level > 0:
+            new_geometries[in_group] = simplify_footprints(geometries[in_group], level, scale)
+            errors = shapely.hausdorff_distance(geometries[in_group], new_geometries[in_group])
+
+        tolerance, grid = simplification_levels[level]
+        report.append({'group': name, 'records': int(np.sum(in_group)), 'level': level, 'tolerance': tolerance, 'grid': grid,
+                       'geometry_mb': sizes[name][level] / 1024 / 1024,
+                       'error_mean': float(np.nanmean(errors)) if len(errors) > 0 else 0.0,
+                       'error_max': float(np.nanmax(errors)) if len(errors) > 0 else 0.0})
+
+    data_gpd = data_gpd.set_geometry(gpd.GeoSeries(new_geometries, index=data_gpd.index, crs=data_gpd.crs))
+    report = pd.DataFrame(report)
+    print('Estimated output size: ' + str(round(estimate_shapefile_size(data_gpd) / 1024 / 1024, 2)) + ' MB (budget: ' + str(budget_mb) + ' MB)')
+    print(report.to_string(index=False))
+    return data_gpd, report
+
+
+# fit the data into budget_mb & write it (see metadata_io.py); returns the report (see fit_to_budget)
+#   - only shapefiles are fitted (the size estimate is for shapefiles); other formats are written as they are & the
+#     report is None
+def write_within_budget(data_gpd, outfile, budget_mb=arcgis_budget_mb, group_column=None):
+    report = None
+    if storage_format(outfile) == 'shapefile':
+        data_gpd, report = fit_to_budget(data_gpd, budget_mb=budget_mb, group_column=group_column)
+    else:
+        print('Size budget not applied (shapefiles only): ' + outfile)
+    write_metadata(data_gpd, outfile)
+    return report
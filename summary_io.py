@@ -0,0 +1,86 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Reading/writing the mission files of the summary scripts at the same time
+#   - each mission file is read/written in its own thread (reading/writing through GDAL/Arrow mostly runs outside
+#     of the Python interpreter lock, see metadata_io.py), so the slowest file sets the time instead of the sum of all
+#   - prints the number of records & time per file, to see which files dominate, & a sample start time per mission
+
+###########################################################################
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from metadata_io import read_metadata
+from size_budget import arcgis_budget_mb, write_within_budget
+
+
+
+###
+### SETTINGS ###
+###
+
+# number of files read/written at the same time
+io_workers = 8
+
+
+
+###
+### TIMINGS ###
+###
+
+# result of function(*args, **kwargs) & the time it took (seconds)
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# first start time of each mission (mission > data), to see their formats; missions without records (e.g. none in the
+# time window read) are reported instead
+def print_start_times(data, column='starttime'):
+    for mission, mission_data in data.items():
+        if len(mission_data) > 0:
+            print(mission + ' datetime format: ', mission_data[column].iloc[0], '\n')
+        else:
+            print(mission + ': no records in window\n')
+
+
+def print_timings(title, timings, total):
+    print('\n' + title + ' (' + str(round(total, 2)) + ' s in total):')
+    for mission, (records, seconds, path) in timings.items():
+        print('    ' + mission.ljust(12) + str(records).rjust(9) + ' records' + str(round(seconds, 2)).rjust(9) + ' s    ' + path)
+
+
+
+###
+### READING/WRITING ###
+###
+
+# read the mission files (mission > file) at the same time; returns mission > data (see metadata_io.read_metadata)
+#   - read_options: mission > keyword arguments for read_metadata, e.g. to only read some columns/records (see
+#     mission_schema.read_options)
+def read_missions(infiles, datetime_columns=(), shapefile_names=True, workers=io_workers, read_options=None):
+    read_options = read_options or {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {mission: pool.submit(timed, read_metadata, infile, datetime_columns, shapefile_names, **read_options.get(mission, {})) for mission, infile in infiles.items()}
+        results = {mission: future.result() for mission, future in futures.items()}
+
+    print_timings('Read', {mission: (len(data), seconds, infiles[mission]) for mission, (data, seconds) in results.items()}, time.perf_counter() - start)
+    return {mission: data for mission, (data, _) in results.items()}
+
+
+# write the mission files (mission > (data, file)) at the same time, each shapefile fitted into budget_mb (see
+# size_budget.py); returns mission > size budget report (None for other formats)
+def write_missions(outputs, budget_mb=arcgis_budget_mb, workers=io_workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {mission: pool.submit(timed, write_within_budget, data, outfile, budget_mb) for mission, (data, outfile) in outputs.items()}
+        results = {mission: future.result() for mission, future in futures.items()}
+
+    print_timings('Written', {mission: (len(outputs[mission][0]), seconds, outputs[mission][1]) for mission, (_, seconds) in results.items()}, time.perf_counter() - start)
+    return {mission: report for mission, (report, _) in results.items()}
@@ -0,0 +1,86 @@
+###
+### TEST FIXTURES ###
+###
+
+# Stand-in OpenSearch server (replays canned result feeds) for testing opensearch.py against SentinelAPI.query
+#   - feeds: query string ('q') > list of entries; unknown queries return no results
+#   - each request waits 'latency' seconds before it's answered (like a round trip to the real API)
+#   - pages are cut from the entries with the 'start' & 'rows' parameters; a page with a single entry is returned as a
+#     dict instead of a list, like the real API
+
+import json
+import os
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+###
+### REPLAY SERVER ###
+###
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        params = parse_qs(urlparse(self.path).query)
+        entries = server.feeds.get(params['q'][0], [])
+        start = int(params.get('start', ['0'])[0])
+        rows = int(params.get('rows', ['100'])[0])
+        page = entries[start:start + rows]
+
+        feed = {'opensearch:totalResults': str(len(entries))}
+        if len(page) == 1:
+            feed['entry'] = page[0]
+        elif len(page) > 1:
+            feed['entry'] = page
+        with server.lock:
+            server.requests.append(start)
+
+        body = json.dumps({'feed': feed}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# one OpenSearch entry, with properties of each type (as the real API returns them)
+def make_entry(i):
+    return {
+        'id': 'uuid-' + str(i),
+        'title': 'S1A_IW_GRDH_' + str(i),
+        'summary': 'Date: 2021-05-01, Instrument: SAR-C SAR',
+        'link': [{'href': 'https://stand-in/odata/' + str(i)}, {'rel': 'icon', 'href': 'https://stand-in/icon/' + str(i)}],
+        'date': [{'name': 'beginposition', 'content': '2021-05-01T10:42:07.' + str(i % 1000).zfill(3) + 'Z'}, {'name': 'ingestiondate', 'content': '2021-05-02T00:00:00Z'}],
+        'int': [{'name': 'orbitnumber', 'content': str(30000 + i)}, {'name': 'relativeorbitnumber', 'content': str(i % 175)}],
+        'double': {'name': 'cloudcoverpercentage', 'content': str(i / 7)},
+        'str': [{'name': 'platformname', 'content': 'Sentinel-1'}, {'name': 'arr', 'str': 'VV VH'}],
+    }
+
+
+# stand-in server on a free local port; yields the server (set server.feeds & server.latency before querying)
+@pytest.fixture
+def opensearch_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReplayHandler)
+    server.feeds = {}
+    server.latency = 0
+    server.requests = []
+    server.lock = threading.Lock()
+    server.url = 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
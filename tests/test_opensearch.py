@@ -0,0 +1,80 @@
+###
+### opensearch.py: parallel paging on the stand-in server (see conftest.py), & vs SentinelAPI.query (sequential) if
+### sentinelsat is installed
+###
+
+import time
+
+from datetime import datetime
+
+import pytest
+
+from conftest import make_entry
+from opensearch import opensearch_session, query_opensearch, format_query, page_size
+
+
+area = 'POLYGON((-83 42,-78 42,-78 45,-83 45,-83 42))'
+date = ('20210501', '20210601')
+
+
+# the query string both backends send for the test query
+def query_string(**keywords):
+    return format_query(area, date, **keywords)
+
+
+def sequential(server, **keywords):
+    SentinelAPI = pytest.importorskip('sentinelsat').SentinelAPI
+    api = SentinelAPI('user', 'password', api_url=server.url, show_progressbars=False)
+    return api.query(area, date=date, **keywords)
+
+
+def parallel(server, connections=8, **keywords):
+    session = opensearch_session('user', 'password', connections)
+    return query_opensearch(session, server.url, area, date=date, connections=connections, **keywords)
+
+
+# several full pages & a short last page (a single entry, which the API returns as a dict instead of a list)
+@pytest.mark.parametrize('n', [1, page_size, 3 * page_size + 1, 4 * page_size + 37])
+def test_same_as_sentinelapi(opensearch_server, n):
+    opensearch_server.feeds[query_string(platformname='Sentinel-1')] = [make_entry(i) for i in range(n)]
+    expected = sequential(opensearch_server, platformname='Sentinel-1')
+    result = parallel(opensearch_server, platformname='Sentinel-1')
+
+    assert len(result) == n
+    assert list(result) == list(expected)   # same products, in the same order
+    assert result == expected               # same properties & values (converted the same way)
+
+
+def test_zero_results(opensearch_server):
+    result = parallel(opensearch_server, platformname='Sentinel-2')
+
+    assert len(result) == 0
+    assert opensearch_server.requests == [0]   # no pages after the first
+
+
+# same query strings as SentinelAPI.format_query (dates, ranges, sets, quoting)
+@pytest.mark.parametrize('query_area, query_date, keywords', [
+    (area, date, {'platformname': 'Sentinel-1'}),
+    (area, (datetime(2021, 5, 1, 3), datetime(2021, 6, 1)), {'platformname': 'Sentinel-3', 'instrumentshortname': 'OLCI', 'ingestiondate': (datetime(2021, 5, 3, 1, 2, 3, 456000), datetime(2021, 6, 1))}),
+    (None, ('NOW-1DAY', 'NOW'), {'cloudcoverpercentage': (0, 30), 'producttype': {'S2MSI1C', 'S2MSI2A'}}),
+    (area, None, {'platformname': 'Sentinel 2', 'relativeorbitnumber': 12, 'filename': 'S2A_*'}),
+    (area, '[NOW-7DAYS TO NOW]', {'cloudcoverpercentage': (None, 20)}),
+])
+def test_same_query_string(query_area, query_date, keywords):
+    SentinelAPI = pytest.importorskip('sentinelsat').SentinelAPI
+    assert format_query(query_area, query_date, **keywords) == SentinelAPI.format_query(query_area, query_date, **keywords)
+
+
+# with latency on every request, the pages after the first are in flight at the same time
+def test_pages_fetched_in_parallel(opensearch_server):
+    n_pages = 8
+    opensearch_server.feeds[query_string()] = [make_entry(i) for i in range(n_pages * page_size)]
+    opensearch_server.latency = 0.2
+
+    start = time.perf_counter()
+    result = parallel(opensearch_server, connections=n_pages)
+    elapsed = time.perf_counter() - start
+
+    assert list(result) == ['uuid-' + str(i) for i in range(n_pages * page_size)]
+    assert sorted(opensearch_server.requests) == [page * page_size for page in range(n_pages)]
+    assert elapsed < (n_pages - 2) * opensearch_server.latency   # sequential paging takes n_pages * latency
@@ -0,0 +1,98 @@
+###
+### summary_io.read_missions on a landsat89.py output: pushed-down reads vs a full read filtered afterwards, &
+### missions left empty by the time window
+###
+
+# data/LANDSAT-8-9_data_Level_1-2_merge_sample.shp: the first records of a merged Level 1-2 file written by landsat89.py
+
+import os
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+from metadata_io import read_metadata, write_metadata, as_datetime
+from mission_schema import mission_schemas, project_mission, read_options, input_columns
+from summary_io import read_missions, print_start_times
+
+
+landsat_sample = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'LANDSAT-8-9_data_Level_1-2_merge_sample.shp')
+
+# as in the summary scripts
+datetime_columns = ['beginposit', 'ingestiond', 'starttime']
+fields = mission_schemas['LANDSAT']['fields']
+date_start, date_end = '2022-04-30', '2022-11-08'
+bbox = (-88, 41, -78, 47)
+
+
+# the sample in each storage format (landsat89.py writes any of them, see metadata_io.write_metadata)
+@pytest.fixture(params=['.shp', '.gpkg', '.parquet'])
+def landsat_file(request, tmp_path):
+    if request.param == '.shp':
+        return landsat_sample
+    path = str(tmp_path / ('landsat' + request.param))
+    write_metadata(read_metadata(landsat_sample), path)
+    return path
+
+
+# web app fields of the whole file, filtered afterwards (what the summary scripts did before reads were pushed down)
+def full_read(infile):
+    data = project_mission(read_missions({'LANDSAT': infile})['LANDSAT'], 'LANDSAT', fields=fields)
+    data = data[(data['starttime'] >= date_start) & (data['starttime'] < date_end)]
+    return data.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]].reset_index(drop=True)
+
+
+def test_pushed_down_read(landsat_file):
+    data = read_missions({'LANDSAT': landsat_file}, datetime_columns=datetime_columns,
+                         read_options={'LANDSAT': read_options('LANDSAT', fields, date_start, date_end, bbox)})['LANDSAT']
+    data = project_mission(data, 'LANDSAT', fields=fields)
+    expected = full_read(landsat_file)
+
+    assert 0 < len(expected) < len(read_metadata(landsat_file))   # the window & box leave some records out
+    data = data.sort_values('filename').reset_index(drop=True)
+    expected = expected.sort_values('filename').reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.DataFrame(data.drop(columns='geometry')), pd.DataFrame(expected.drop(columns='geometry')), check_dtype=False)
+    assert data.geometry.geom_equals(expected.geometry).all()
+
+
+# LANDSAT start times (day of year) are parsed in their own format, with the other missions' datetime columns
+def test_landsat_starttime_parsed(landsat_file):
+    data = read_missions({'LANDSAT': landsat_file}, datetime_columns=datetime_columns, read_options={'LANDSAT': read_options('LANDSAT')})['LANDSAT']
+    raw = read_metadata(landsat_file)
+
+    assert pd.api.types.is_datetime64_any_dtype(data['starttime'])
+    assert (data['starttime'] == pd.to_datetime(raw['starttime'], format='%Y:%j:%H:%M:%S.%f')).all()
+    assert project_mission(data, 'LANDSAT', fields=fields)['starttime'].equals(data['starttime'])
+
+
+# Sentinel-2 file with n records starting from 'start' (one a day), in the input columns of the summary fields
+def sentinel2_file(path, start, n=10):
+    columns = input_columns('Sentinel-2', mission_schemas['Sentinel-2']['fields'])
+    data = {column: ['S2-' + column + '-' + str(i) for i in range(n)] for column in columns}
+    data.update({'beginposit': pd.date_range(start, periods=n, freq='D'), 'ingestiond': pd.date_range(start, periods=n, freq='D'),
+                 'orbitnumbe': range(n), 'relativeor': range(n), 'cloudcover': [10.0] * n, 'platformna': ['Sentinel-2'] * n})
+    footprints = [shapely.box(-83 + i / 10, 42, -82 + i / 10, 43) for i in range(n)]
+    write_metadata(gpd.GeoDataFrame(data, geometry=footprints, crs='EPSG:4326'), path)
+    return path
+
+
+# the data summary script's path (read > fields > sample start times > combined & clipped to the window) with a window
+# that has no LANDSAT records: LANDSAT comes back empty & is reported, the other mission is summarized
+def test_summary_with_empty_mission(tmp_path, capsys):
+    window = ('2021-04-30', '2021-12-01')   # the sample is 2022 data
+    infiles = {'Sentinel-2': sentinel2_file(str(tmp_path / 's2.shp'), '2021-05-01'), 'LANDSAT': landsat_sample}
+
+    data = read_missions(infiles, datetime_columns=datetime_columns,
+                         read_options={mission: read_options(mission, mission_schemas[mission]['fields'], window[0], window[1]) for mission in infiles})
+    data = {mission: project_mission(data[mission], mission, fields=mission_schemas[mission]['fields']) for mission in data}
+    print_start_times(data)
+
+    data_sum = pd.concat(list(data.values()), ignore_index=True)
+    data_sum['starttime'] = as_datetime(data_sum['starttime'])
+    data_sum = data_sum[(data_sum['starttime'] > window[0]) & (data_sum['starttime'] < window[1])]
+
+    assert len(data['LANDSAT']) == 0
+    assert 'LANDSAT: no records in window' in capsys.readouterr().out
+    assert len(data_sum) == 10
+    assert (data_sum['mission'] == 'Sentinel-2').all()
@@ -0,0 +1,37 @@
+###
+### wrs_cache.py: the WRS path/row shortcuts vs the exact ROI filter (roi_filter.filter_to_roi)
+###
+
+import geopandas as gpd
+import pytest
+import shapely
+
+from roi_filter import filter_to_roi
+from wrs_cache import empty_wrs_cache, filter_to_roi_wrs, update_wrs_cache
+
+
+# scenes of one path/row, with their footprints shifted east by 'shifts' (degrees) from box(0, 0, 2, 2)
+def scenes(shifts):
+    footprints = [shapely.box(shift, 0, 2 + shift, 2) for shift in shifts]
+    return gpd.GeoDataFrame({'WRS Path': 17, 'WRS Row': 30, 'Nadir/Off Nadir': 'NADIR', 'shift': shifts}, geometry=footprints, crs='EPSG:4326')
+
+
+def roi(minx, maxx):
+    return gpd.GeoDataFrame(geometry=[shapely.box(minx, 0.5, maxx, 1)], crs='EPSG:4326')
+
+
+# the cache is built from the first run's scenes; the next run has scenes shifted further than the margin, which the
+# first run's hull would call 'outside' (ROI east of the first footprints) or its core 'inside' (ROI barely in them)
+@pytest.mark.parametrize('roi_gpd', [roi(2.2, 3), roi(-1, 0.2)])
+def test_same_as_filter_to_roi(roi_gpd):
+    cache = empty_wrs_cache()
+    for run in [[0, 0.01, -0.01], [0, 0.3, -0.3, 0.25], [0.5, 0]]:
+        data_gpd = scenes(run)
+        subset, summary = filter_to_roi_wrs(data_gpd, roi_gpd, cache)
+        assert sorted(subset['shift']) == sorted(filter_to_roi(data_gpd, roi_gpd)['shift'])
+        cache = update_wrs_cache(cache, [summary])
+
+    # hull & core take in every scene seen so far
+    assert len(cache) == 1 and cache['n_scenes'][0] == 9
+    assert shapely.equals(cache['hull'][0], shapely.box(-0.3, 0, 2.5, 2))
+    assert shapely.equals(cache['core'][0], shapely.box(0.5, 0, 1.7, 2))
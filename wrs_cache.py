@@ -0,0 +1,162 @@
+###
+### MODULE DESCRIPTION ###
+###
+
+### SHORT DESCRPITION ###
+# Footprint cache per LANDSAT WRS path/row
+#   - scenes with the same 'WRS Path'/'WRS Row' have nearly the same footprint, so the ROI test only needs to run
+#     once per path/row instead of once per scene
+#   - for every path/row the cache keeps 2 shapes, built from all the (nadir) footprints seen so far & updated with the
+#     new footprints of every run:
+#       - hull: convex hull of the footprints (every scene of the path/row is inside it)
+#       - core: intersection of the footprints (every scene of the path/row covers it)
+#   - a run's own footprints are added before its scenes are classified, so the shortcuts below are exact for them (the
+#     same subset as roi_filter.filter_to_roi)
+#   - against a region of interest, each path/row is then:
+#       - outside: the hull (+ margin) doesn't touch the ROI > none of its scenes intersect the ROI
+#       - inside: the core (- margin) touches the ROI > all of its scenes intersect the ROI
+#       - otherwise (or not cached yet, or an off-nadir scene): the scene's own footprint is tested
+#   - the cache is a parquet file that persists between runs, so repeat acquisitions become a join on path/row
+
+### LIMITATIONS ###
+# - the margin (in degrees) is kept as a safety margin on top of that; off-nadir acquisitions can be shifted much
+#   further (they'd blow up the hull & shrink the core), so they're left out & always tested with their own footprint
+
+###########################################################################
+
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from roi_filter import intersects_roi
+
+
+
+###
+### CACHE SETTINGS ###
+###
+
+wrs_columns = ['WRS Path', 'WRS Row']
+
+# tolerance (degrees) for the difference between footprints of the same path/row
+wrs_margin = 0.05
+
+# path/row status against a region of interest
+wrs_outside = 0
+wrs_inside = 1
+wrs_partial = 2
+
+
+
+###
+### READING/WRITING THE CACHE ###
+###
+
+def empty_wrs_cache():
+    return pd.DataFrame({'WRS Path': pd.Series(dtype='int64'), 'WRS Row': pd.Series(dtype='int64'), 'hull': pd.Series(dtype=object), 'core': pd.Series(dtype=object), 'n_scenes': pd.Series(dtype='int64')})
+
+
+# read the cache (hull/core as shapely geometries); empty if there's no cache file yet
+def read_wrs_cache(cache_file):
+    if cache_file is None or not os.path.exists(cache_file):
+        return empty_wrs_cache()
+
+    cache = pd.read_parquet(cache_file)
+    cache['hull'] = shapely.from_wkb(cache['hull'].to_numpy())
+    cache['core'] = shapely.from_wkb(cache['core'].to_numpy())
+    return cache
+
+
+def write_wrs_cache(cache, cache_file):
+    cache = cache.copy()
+    cache['hull'] = shapely.to_wkb(cache['hull'].to_numpy())
+    cache['core'] = shapely.to_wkb(cache['core'].to_numpy())
+    cache.to_parquet(cache_file, index=False)
+
+
+
+###
+### BUILDING THE CACHE ###
+###
+
+# only scenes acquired at nadir are used for (and filtered with) the cache
+def nadir_scenes(data_gpd):
+    if 'Nadir/Off Nadir' not in data_gpd.columns:
+        return np.ones(len(data_gpd), dtype=bool)
+    return (data_gpd['Nadir/Off Nadir'] == 'NADIR').to_numpy()
+
+
+# hull/core of the nadir scenes in data_gpd, for every path/row
+def summarize_wrs(data_gpd):
+    data_gpd = data_gpd.loc[nadir_scenes(data_gpd)]
+    if len(data_gpd) == 0:
+        return empty_wrs_cache()
+
+    geometry = pd.Series(np.asarray(data_gpd.geometry.values), index=data_gpd.index)
+    groups = geometry.groupby([data_gpd['WRS Path'], data_gpd['WRS Row']])
+    summary = groups.agg(
+        hull=lambda footprints: shapely.convex_hull(shapely.union_all(footprints.to_numpy())),
+        core=lambda footprints: shapely.intersection_all(footprints.to_numpy()),
+        n_scenes='size',
+    ).reset_index()
+    return summary
+
+
+# add summaries to the cache: the hull of a path/row grows to take in the new hulls (union) & its core shrinks to
+# what the new cores also cover (intersection); new path/rows are added
+def update_wrs_cache(cache, summaries):
+    summaries = [summary for summary in summaries if summary is not None and len(summary) > 0]
+    if len(summaries) == 0:
+        return cache
+
+    merged = pd.concat([cache] + summaries, ignore_index=True)
+    merged = merged.groupby(wrs_columns, as_index=False, sort=False).agg(
+        hull=('hull', lambda hulls: shapely.convex_hull(shapely.union_all(hulls.to_numpy()))),
+        core=('core', lambda cores: shapely.intersection_all(cores.to_numpy())),
+        n_scenes=('n_scenes', 'sum'),
+    )
+    return merged.reset_index(drop=True)
+
+
+
+###
+### FILTERING WITH THE CACHE ###
+###
+
+# status of every cached path/row against the region of interest (outside/inside/partial)
+def classify_wrs(cache, roi_gpd):
+    status = np.full(len(cache), wrs_partial, dtype='int8')
+    if len(cache) == 0:
+        return status
+
+    hull = gpd.GeoSeries(shapely.buffer(cache['hull'].to_numpy(), wrs_margin), crs='EPSG:4326')
+    core = gpd.GeoSeries(shapely.buffer(cache['core'].to_numpy(), -wrs_margin), crs='EPSG:4326')
+
+    status[~intersects_roi(hull, roi_gpd)] = wrs_outside
+    status[intersects_roi(core, roi_gpd)] = wrs_inside
+    return status
+
+
+# subset of a GeoDataFrame whose footprints intersect the region of interest, using the path/row cache where possible
+#   - the path/rows are classified with the cache updated with these scenes, so every nadir scene is inside the hull &
+#     covers the core it's classified with
+#   - returns the subset and the summary of these scenes' path/rows (to be added to the cache, see update_wrs_cache)
+def filter_to_roi_wrs(data_gpd, roi_gpd, cache):
+    summary = summarize_wrs(data_gpd)
+    cache = update_wrs_cache(cache, [summary])
+
+    cached = cache[wrs_columns].assign(wrs_status=classify_wrs(cache, roi_gpd))
+    status = data_gpd[wrs_columns].merge(cached, on=wrs_columns, how='left')['wrs_status']
+    status = status.fillna(wrs_partial).to_numpy(dtype='int8', copy=True)
+    status[~nadir_scenes(data_gpd)] = wrs_partial
+
+    keep = status == wrs_inside
+    partial = status == wrs_partial
+    keep[partial] = intersects_roi(data_gpd.geometry[partial], roi_gpd)
+
+    n_cached = int(np.sum(~partial))
+    print(str(n_cached) + '/' + str(len(data_gpd)) + ' scenes filtered by WRS path/row')
+    return data_gpd.loc[keep], summary